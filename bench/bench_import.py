@@ -0,0 +1,123 @@
+#! /usr/bin/env python
+"""
+Benchmark for how long `import todo` takes.
+
+Each run is a fresh interpreter, timed with `-X importtime`. It also lists
+which of the modules todo defers until a session actually starts got imported
+anyway; with --check, any of them showing up is a failure.
+
+    python bench/bench_import.py [--repeat 20] [--check] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_placeholder import git_commit, print_table
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# only needed once there's a session, a broker, a store or a coroutine
+DEFERRED_MODULES = [
+    'ast',
+    'asyncio',
+    'code',
+    'ctypes',
+    'inspect',
+    'json',
+    'mmap',
+    'pickle',
+    'readline',
+    'socket',
+    'textwrap',
+]
+
+
+def run_python(*args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)  # measure with .pyc files
+    return subprocess.run(
+        [sys.executable, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_seconds(module):
+    """
+    Cumulative import time of `module` in a fresh interpreter.
+    """
+    stderr = run_python('-X', 'importtime', '-c', 'import ' + module).stderr
+    # lines look like "import time:  self [us] | cumulative | module"
+    for line in reversed(stderr.splitlines()):
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+    raise RuntimeError('No import time reported for {}'.format(module))
+
+
+def bench_import(repeat):
+    run_python('-c', 'import todo')  # warm up, and write the .pyc files
+    times = [import_seconds('todo') for _ in range(repeat)]
+    baseline = [import_seconds('typing') for _ in range(repeat)]
+    return [{
+        'bench': 'import',
+        'repeat': repeat,
+        'seconds_median': statistics.median(times),
+        'seconds_min': min(times),
+        'seconds_typing_median': statistics.median(baseline),
+    }]
+
+
+def loaded_deferred_modules():
+    stdout = run_python('-c', (
+        'import sys, todo; '
+        'print("\\n".join(m for m in {!r} if m in sys.modules))'
+    ).format(DEFERRED_MODULES)).stdout
+    return stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument(
+        '--check', action='store_true',
+        help='fail if any deferred module is imported by `import todo`',
+    )
+    parser.add_argument('--output', help='write results here as JSON')
+    args = parser.parse_args()
+
+    results = bench_import(args.repeat)
+    loaded = loaded_deferred_modules()
+
+    print_table(results)
+    print('deferred modules imported anyway: {}'.format(
+        ', '.join(loaded) or 'none'
+    ))
+    if args.output:
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'commit': git_commit(),
+                'timestamp': time.time(),
+            },
+            'results': results,
+            'loaded_deferred_modules': loaded,
+        }
+        with open(args.output, 'w') as out_f:
+            json.dump(report, out_f, indent=2)
+    if args.check and loaded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
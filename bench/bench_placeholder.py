@@ -0,0 +1,258 @@
+#! /usr/bin/env python
+"""
+Benchmarks for placeholder overhead.
+
+Everything runs against generated source files in a temp directory, with
+sessions answered by `todo.ScriptedInput`, so no one needs to be at the
+terminal.
+
+    python bench/bench_placeholder.py [--quick] [--output results.json]
+
+Results are printed as a table and, with --output, written as JSON so runs can
+be compared against each other.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import todo
+from todo import placeholder
+
+
+ACCESS_TEMPLATE = '''\
+import todo
+
+p = todo.{cls}(rewrite_source=False)
+
+
+def run(n):
+    x = 1
+    y = z = 0
+    for _ in range(n):
+        {access}
+'''
+
+FILLS = {
+    'expression': ('ExpressionPlaceholder', ['x + 1'], 'x + 1'),
+    'statement': ('StatementPlaceholder', ['y = x + 1'], 'y = x + 1'),
+    'multiline': (
+        'MultilinePlaceholder',
+        ['!y = x + 1', '!z = y * 2'],
+        'y = x + 1; z = y * 2',
+    ),
+}
+
+REWRITE_TEMPLATE = '''\
+import time
+import todo
+
+{filler}
+x = 1
+_t0 = time.perf_counter()
+y = todo.set_placeholder('k')
+_t1 = time.perf_counter()
+'''
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        with contextlib.redirect_stderr(io.StringIO()):
+            yield
+
+
+def reset():
+    placeholder.default_session.clear()
+    placeholder.default_rewrite_ctx.clear()
+    placeholder.default_call_sites.clear()
+    placeholder.default_source_index.clear()
+
+
+def per_call(fn, n, repeat):
+    best = min(timeit.repeat(lambda: fn(n), number=1, repeat=repeat))
+    return best / n
+
+
+def bench_access(tmp, n, repeat):
+    results = []
+    for mode, (cls, lines, inline) in FILLS.items():
+        accesses = {
+            'call': "todo.set_placeholder('k', replace_mode='{}', "
+                    "rewrite_source=False)".format(mode),
+            'attr': 'p.k',
+            'inline': inline,
+        }
+        for via, access in accesses.items():
+            reset()
+            path = os.path.join(tmp, 'access_{}_{}.py'.format(mode, via))
+            with open(path, 'w') as out_f:
+                out_f.write(ACCESS_TEMPLATE.format(cls=cls, access=access))
+            todo.set_input(todo.ScriptedInput({'k': lines}))
+            module = runpy.run_path(path)
+            with quiet():
+                module['run'](1)  # first hit fills the key
+            results.append({
+                'bench': 'access',
+                'mode': mode,
+                'via': via,
+                'seconds_per_access': per_call(module['run'], n, repeat),
+            })
+    return results
+
+
+def make_filler(n_lines, line_length):
+    lines = []
+    for i in range(n_lines):
+        line = 'v_{} = {}  # '.format(i, i)
+        lines.append(line + 'x' * max(0, line_length - len(line)))
+    return '\n'.join(lines)
+
+
+def bench_rewrite(tmp, sizes, lengths, repeat):
+    results = []
+    for deferred in (False, True):
+        for n_lines in sizes:
+            for line_length in lengths:
+                filler = make_filler(n_lines, line_length)
+                times = []
+                for i in range(repeat):
+                    reset()
+                    path = os.path.join(tmp, 'rewrite_{}_{}_{}_{}.py'.format(
+                        int(deferred), n_lines, line_length, i
+                    ))
+                    with open(path, 'w') as out_f:
+                        out_f.write(REWRITE_TEMPLATE.format(filler=filler))
+                    session = placeholder.ExpressionPlaceholderSession(path)
+                    session.set_fill('k', 'x + 1')
+                    placeholder.default_session[(path, 'expression')] = session
+                    todo.defer_rewrites(deferred)
+                    module = runpy.run_path(path)
+                    t0 = time.perf_counter()
+                    todo.flush()
+                    elapsed = module['_t1'] - module['_t0']
+                    elapsed += time.perf_counter() - t0
+                    todo.defer_rewrites(False)
+                    times.append(elapsed)
+                results.append({
+                    'bench': 'rewrite',
+                    'deferred': deferred,
+                    'lines': n_lines,
+                    'line_length': line_length,
+                    'file_bytes': os.path.getsize(path),
+                    'seconds': min(times),
+                })
+    return results
+
+
+def bench_search(ref_counts, repeat):
+    results = []
+    key = placeholder.PlaceholderAccessor(
+        'k', 'call', placeholder.set_placeholder
+    )
+    for refs in ref_counts:
+        frame_vars = {'todo': todo, 'x': 1}
+        calls = []
+        for i in range(refs):
+            frame_vars['sp_{}'.format(i)] = placeholder.set_placeholder
+            calls.append("sp_{}('other_{}')".format(i, i))
+        calls.append("todo.set_placeholder('k')")
+        line = 'y = [{}]\n'.format(', '.join(calls))
+        index = placeholder.SourceIndex(line)
+
+        search = timeit.Timer(
+            lambda: placeholder.RewriteContext._find_call_access(
+                line, key, frame_vars
+            )
+        )
+        number, _ = search.autorange()
+        text_seconds = min(search.repeat(repeat, number)) / number
+
+        lookup = timeit.Timer(lambda: index.find(1, key, frame_vars))
+        number, _ = lookup.autorange()
+        index_seconds = min(lookup.repeat(repeat, number)) / number
+
+        results.append({
+            'bench': 'search',
+            'refs': refs,
+            'line_length': len(line),
+            'seconds_text_search': text_seconds,
+            'seconds_index_lookup': index_seconds,
+        })
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    for result in results:
+        params = ' '.join(
+            '{}={}'.format(k, v) for k, v in result.items()
+            if not k.startswith('seconds')
+        )
+        timings = ' '.join(
+            '{}={:.3g}us'.format(k[len('seconds'):].lstrip('_') or 'time', v * 1e6)
+            for k, v in result.items() if k.startswith('seconds')
+        )
+        print('{:<60} {}'.format(params, timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--quick', action='store_true', help='smaller sizes')
+    parser.add_argument('--output', help='write results here as JSON')
+    args = parser.parse_args()
+
+    if args.quick:
+        n, repeat = 10000, 3
+        sizes, lengths = [100, 1000], [40, 400]
+        ref_counts = [1, 10, 50]
+    else:
+        n, repeat = 100000, 5
+        sizes, lengths = [100, 1000, 10000, 50000], [40, 400, 4000]
+        ref_counts = [1, 10, 50, 100]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        results += bench_access(tmp, n, repeat)
+        results += bench_rewrite(tmp, sizes, lengths, repeat)
+        results += bench_search(ref_counts, repeat)
+
+    print_table(results)
+    if args.output:
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'commit': git_commit(),
+                'timestamp': time.time(),
+                'quick': args.quick,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as out_f:
+            json.dump(report, out_f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Placeholder edits the file it's run from, so anything that gets as far as a
+rewrite runs as a script in its own process, on a copy in a temporary
+directory, with its answers fed through `TODO_PLACEHOLDER_INPUT`.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+from typing import *
+
+import pytest
+
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TEST_DIR)
+
+
+class Script:
+    def __init__(self, path: str):
+        self.path = path
+        self.dir = os.path.dirname(path)
+
+    @property
+    def source(self) -> str:
+        with open(self.path, 'r') as in_f:
+            return in_f.read()
+
+    def run(
+            self,
+            answers: Optional[Mapping[str, Any]] = None,
+            args: Sequence[str] = (),
+            env: Optional[Mapping[str, str]] = None,
+            check: bool = True,
+    ) -> subprocess.CompletedProcess:
+        """
+        Run the script with `answers` (see `todo.ScriptedInput`), and return
+        the finished process. With `check`, it has to exit cleanly.
+        """
+        return self.python(
+            self.path, *args, answers=answers, env=env, check=check
+        )
+
+    def python(
+            self,
+            *argv: str,
+            answers: Optional[Mapping[str, Any]] = None,
+            env: Optional[Mapping[str, str]] = None,
+            check: bool = True,
+    ) -> subprocess.CompletedProcess:
+        """
+        Run `python *argv` in the script's directory, like `run`.
+        """
+        run_env = dict(os.environ, PYTHONPATH=ROOT)
+        for name in list(run_env):
+            if name.startswith('TODO_PLACEHOLDER_'):
+                del run_env[name]
+        if answers is not None:
+            answers_path = os.path.join(self.dir, 'answers.json')
+            with open(answers_path, 'w') as out_f:
+                json.dump(answers, out_f)
+            run_env['TODO_PLACEHOLDER_INPUT'] = answers_path
+        run_env.update(env or {})
+        proc = subprocess.run(
+            [sys.executable, *argv],
+            cwd=self.dir,
+            env=run_env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        if check and proc.returncode != 0:
+            raise AssertionError(
+                '{} exited with {}:\n{}'.format(
+                    ' '.join(argv), proc.returncode, proc.stderr
+                )
+            )
+        return proc
+
+
+@pytest.fixture
+def template(tmp_path) -> Callable[[str], Script]:
+    """
+    template(name) copies test/<name>.py.template (and the module the
+    templates import) into a temporary directory.
+    """
+    def copy(name: str) -> Script:
+        shutil.copy(os.path.join(TEST_DIR, 'test_module.py'), tmp_path)
+        path = os.path.join(str(tmp_path), name + '.py')
+        shutil.copy(os.path.join(TEST_DIR, name + '.py.template'), path)
+        return Script(path)
+    return copy
+
+
+@pytest.fixture
+def script(tmp_path) -> Callable[..., Script]:
+    """
+    script(source, name='app.py') writes a script to a temporary directory,
+    dedented, so it can be written inline.
+    """
+    def write(source: str, name: str = 'app.py') -> Script:
+        path = os.path.join(str(tmp_path), name)
+        with open(path, 'w') as out_f:
+            out_f.write(textwrap.dedent(source).lstrip())
+        return Script(path)
+    return write
+
+
+@pytest.fixture
+def answers():
+    """
+    answers(mapping) feeds placeholders in this process from `mapping`, until
+    the test is over.
+    """
+    import todo
+    yield lambda mapping: todo.set_input(todo.ScriptedInput(mapping))
+    todo.set_input(None)
@@ -0,0 +1,27 @@
+"""
+map_placeholder: one fill evaluated over a batch of inputs.
+"""
+
+
+def test_map_placeholder_row_by_row(script):
+    app = script('''
+        import todo
+        def go(rows, off):
+            return list(todo.map_placeholder('first', rows))
+        print(go([[1, 2], [3, 4]], 10), go([[5, 6]], 100))
+    ''')
+    proc = app.run({'first': ['row[0] + off']})
+    assert proc.stdout.splitlines()[-1] == '[11, 13] [105]'
+
+
+def test_map_placeholder_fill_is_kept_by_key(script):
+    app = script('''
+        import todo
+        print(list(todo.map_placeholder('double', [1, 2], name='n')))
+        print(list(todo.map_placeholder('double', [3], name='n')))
+    ''')
+    source = app.source
+    proc = app.run({'double': ['n * 2']})
+    assert proc.stdout.splitlines()[-2:] == ['[2, 4]', '[6]']
+    # the call stays, it's the loop around the fill
+    assert app.source == source
@@ -0,0 +1,34 @@
+"""
+The fill broker: worker processes ask the parent for fills.
+"""
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize('method', ['fork', 'spawn'])
+def test_broker(script, method):
+    if method == 'fork' and sys.platform == 'win32':
+        pytest.skip('no fork')
+    app = script('''
+        import multiprocessing
+        import sys
+        import todo
+
+        def work(i):
+            y = todo.set_placeholder('double', rewrite_source=False)
+            return y + todo.set_placeholder(rewrite_source=False)
+
+        if __name__ == '__main__':
+            ctx = multiprocessing.get_context(sys.argv[1])
+            with todo.FillBroker():
+                with ctx.Pool(4) as pool:
+                    print(pool.map(work, range(8)))
+    ''')
+    proc = app.run(
+        {'double': ['i * 2'], '<anonymous>': [['i + 100']] * 8},
+        args=[method],
+    )
+    assert proc.stdout.splitlines()[-1] == str(
+        [3 * i + 100 for i in range(8)]
+    )
@@ -0,0 +1,132 @@
+from typing import *
+
+from todo.placeholder import (
+    ExpressionPlaceholderSession,
+    MultilinePlaceholderSession,
+    StatementPlaceholderSession,
+)
+
+
+def reader(lines: List[str]) -> Callable[[str], str]:
+    lines = list(lines)
+
+    def read(prompt: str) -> str:
+        if not lines:
+            raise EOFError
+        return lines.pop(0)
+    return read
+
+
+def run(session_type, lines: List[str], local: Optional[dict] = None):
+    session = session_type('app.py')
+    fill_lines, console = session.run_interpreter(
+        '', dict(local or {'x': 1}), reader(lines)
+    )
+    return session.parse_session(fill_lines), session.session_result(console)
+
+
+def test_expression():
+    fill, result = run(ExpressionPlaceholderSession, ['x + 1', 'x + 2'])
+    assert fill == 'x + 2'
+    assert result == (3, {})
+
+
+def test_expression_after_a_binding():
+    fill, result = run(ExpressionPlaceholderSession, ['y = 5', 'x + y'])
+    assert fill == 'x + y'
+    # running `x + y` against the frame won't see y
+    assert result is None
+
+
+def test_expression_that_raised():
+    fill, result = run(ExpressionPlaceholderSession, ['x + 1', 'x / 0'])
+    assert fill == 'x / 0'
+    assert result is None
+
+
+def test_expression_value_none():
+    _, result = run(ExpressionPlaceholderSession, ['print(x)'])
+    assert result == (None, {})
+
+
+def test_block_isnt_a_single_line():
+    _, result = run(
+        ExpressionPlaceholderSession, ['if x:', '    x + 1', '', 'x']
+    )
+    assert result == (1, {})
+    _, result = run(
+        StatementPlaceholderSession, ['for i in range(3):', '    x += i', '']
+    )
+    assert result is None
+
+
+def test_half_typed_block():
+    _, result = run(StatementPlaceholderSession, ['x = 2', 'if x:'])
+    assert result is None
+
+
+def test_statement():
+    fill, result = run(StatementPlaceholderSession, ['x + 10', 'y = x * 2'])
+    assert fill == 'y = x * 2'
+    assert result == (None, {'y': 2})
+
+
+def test_statement_del():
+    _, result = run(StatementPlaceholderSession, ['del x'])
+    assert result is None
+
+
+def test_multiline():
+    fill, result = run(MultilinePlaceholderSession, [
+        'x + 100',
+        '!y = x + 1',
+        '!z = y * 2',
+    ])
+    assert fill == ['y = x + 1', 'z = y * 2']
+    assert result == (None, {'y': 2, 'z': 4})
+
+
+def test_multiline_block():
+    fill, result = run(MultilinePlaceholderSession, [
+        '!for i in range(3):',
+        '!    x += i',
+        '!',
+    ])
+    assert fill == ['for i in range(3):', '    x += i', '']
+    assert result == (None, {'x': 4, 'i': 2})
+
+
+def test_multiline_unrecorded_binding():
+    fill, result = run(MultilinePlaceholderSession, ['tmp = 3', '!y = tmp'])
+    assert fill == ['y = tmp']
+    assert result is None
+
+
+def test_multiline_partly_recorded_block():
+    _, result = run(MultilinePlaceholderSession, [
+        '!if x:',
+        '    y = 1',
+        '!',
+    ])
+    assert result is None
+
+
+def test_multiline_statement_that_raised():
+    _, result = run(MultilinePlaceholderSession, ['!y = 1 / 0'])
+    assert result is None
+
+
+def test_session_result_is_the_first_hit(script):
+    app = script('''
+        import todo
+        calls = []
+        def bump():
+            calls.append(1)
+            return len(calls)
+        print('got', todo.set_placeholder('k', rewrite_source=False))
+        todo.set_placeholder('s', 'statement', rewrite_source=False)
+        print('got', s, len(calls))
+    ''')
+    proc = app.run({'k': ['bump()'], 's': ['s = bump()']})
+    # each fill ran once, in its session, and that was the hit's result
+    assert proc.stdout.splitlines()[-2:] == ['got 1', 'got 2 2']
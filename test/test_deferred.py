@@ -0,0 +1,33 @@
+"""
+Deferred rewrites: edits kept until a flush, then made in one pass.
+"""
+
+
+def test_deferred_rewrite(script):
+    app = script('''
+        import todo
+        todo.defer_rewrites()
+        for i in range(3):
+            x = todo.set_placeholder('k')
+        print(x)
+    ''')
+    proc = app.run({'k': ['i * 2']})
+    assert proc.stdout.split()[-1] == '4'
+    assert 'x = i * 2\n' in app.source
+
+
+def test_deferred_rewrite_to_a_changed_file(script):
+    app = script('''
+        import todo
+        todo.defer_rewrites()
+        x = todo.set_placeholder('k')
+        with open(__file__) as f:
+            src = f.read()
+        with open(__file__, 'w') as f:
+            f.write('# header\\n' + src)
+    ''')
+    original = app.source
+    proc = app.run({'k': ['12345']})
+    assert 'changed since placeholder queued edits' in proc.stderr
+    # the edit isn't made, rather than made a line off
+    assert app.source == '# header\n' + original
@@ -0,0 +1,104 @@
+import random
+
+from todo.splice import EditLog
+
+
+def test_edit_log_lines():
+    edits = EditLog()
+    edits.replace_line(2, 3)  # line 2 became 3 lines
+    assert [edits.line(n) for n in range(5)] == [0, 1, 2, 5, 6]
+    assert [edits.original_line(n) for n in range(7)] == [0, 1, 2, 2, 2, 3, 4]
+
+    edits.replace_line(5, 0)  # original line 3 deleted
+    assert [edits.line(n) for n in range(5)] == [0, 1, 2, 5, 5]
+    assert edits.original_line(5) == 4
+
+
+def test_edit_log_grows():
+    edits = EditLog(size=2)
+    edits.replace_line(0, 2)
+    edits.replace_line(100, 3)
+    assert edits.line(99) == 100
+    assert edits.line(101) == 104
+    assert edits.original_line(104) == 101
+
+
+def test_edit_log_lines_match_a_list_of_lines():
+    rng = random.Random(4)
+    for _ in range(50):
+        edits = EditLog(size=rng.choice([1, 4, 64]))
+        # the original line each current line came from
+        lines = list(range(40))
+        for _ in range(rng.randrange(1, 12)):
+            lineno = rng.randrange(len(lines))
+            new_lines = rng.randrange(0, 4)
+            original = lines[lineno]
+            if lines.count(original) != 1:
+                continue  # only whole original lines get replaced
+            edits.replace_line(lineno, new_lines)
+            lines[lineno:lineno + 1] = [original] * new_lines
+        for original in range(40):
+            if original in lines:
+                assert edits.line(original) == lines.index(original)
+        for lineno, original in enumerate(lines):
+            assert edits.original_line(lineno) == original
+
+
+def test_edit_log_columns():
+    edits = EditLog()
+    # 'x = set_placeholder("k") + set_placeholder("j")'
+    #  0   4                   24 27                 47
+    edits.replace_span(0, 27, 47, 1)  # -> 'x = set_placeholder("k") + 1'
+    edits.replace_span(0, 4, 24, 3)   # -> 'x = abc + 1'
+    assert edits.col(0, 0) == 0
+    assert edits.col(0, 4) is None
+    assert edits.col(0, 24) == 7
+    assert edits.col(0, 27) is None
+    assert edits.col(0, 47) == 11
+    # other lines are untouched
+    assert edits.col(1, 30) == 30
+
+
+def test_edit_log_columns_follow_lines():
+    edits = EditLog()
+    edits.replace_line(0, 3)
+    edits.replace_span(3, 2, 5, 0)  # original line 1
+    assert edits.col(1, 6) == 3
+
+
+def test_edit_log_enclosing_edit_replaces_inner_ones():
+    edits = EditLog()
+    edits.replace_span(0, 10, 20, 2)  # now 10:12
+    edits.replace_span(0, 5, 15, 2)   # original 5:23, now 5:7
+    assert edits.col(0, 4) == 4
+    assert edits.col(0, 12) is None
+    assert edits.col(0, 23) == 7
+    # cutting into an earlier edit can't be mapped, and changes nothing
+    edits.replace_span(0, 3, 6, 10)
+    assert edits.col(0, 23) == 7
+
+
+def test_edit_log_columns_match_a_string():
+    rng = random.Random(22)
+    for _ in range(300):
+        edits = EditLog()
+        # what's at each current column: the original column, or the number
+        # of the edit that put it there; 26 is the end of the line
+        text: list = list(range(27))
+        for edit in range(rng.randrange(1, 8)):
+            start = rng.randrange(len(text))
+            end = rng.randrange(start, len(text))
+            if any(
+                    0 < at < len(text) and isinstance(text[at], str)
+                    and text[at - 1] == text[at]
+                    for at in (start, end)
+            ):
+                continue  # cuts into an earlier edit
+            new_len = rng.randrange(0, 4)
+            edits.replace_span(0, start, end, new_len)
+            text[start:end] = ['edit {}'.format(edit)] * new_len
+        for col in range(27):
+            if col in text:
+                assert edits.col(0, col) == text.index(col)
+            else:
+                assert edits.col(0, col) is None
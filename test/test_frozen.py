@@ -0,0 +1,85 @@
+"""
+Frozen mode: stored fills compiled into modules as they are imported.
+"""
+import os
+
+from todo.store import FillStore
+
+
+def test_freeze_respects_scope(script):
+    mod = script('''
+        import todo
+        p = todo.Placeholder()
+
+        class Path:
+            name = 'real.txt'
+
+        def g(path):
+            p = path
+            return p.name
+
+        def h():
+            return p.name
+    ''', name='mod.py')
+    FillStore(os.path.join(mod.dir, 'fills.jsonl')).put(
+        mod.path, 'expression', 'name', '"filled"', owner='p'
+    )
+    main = script('''
+        import todo
+        todo.freeze('fills.jsonl')
+        import mod
+        print(mod.g(mod.Path()), mod.h())
+    ''', name='main.py')
+    assert main.run({}).stdout.split() == ['real.txt', 'filled']
+
+
+def test_freeze_calls(script):
+    mod = script('''
+        from todo import set_placeholder
+
+        def f(x):
+            y = set_placeholder('y')
+            set_placeholder('z', replace_mode='statement')
+            return y, z
+    ''', name='mod.py')
+    store = FillStore(os.path.join(mod.dir, 'fills.jsonl'))
+    store.put(mod.path, 'expression', 'y', 'x + 1')
+    store.put(mod.path, 'statement', 'z', 'z = x * 2')
+    main = script('''
+        import todo
+        todo.freeze('fills.jsonl')
+        import os
+        import mod
+        # the fills are in the module now, not looked up at the call
+        os.remove('fills.jsonl')
+        todo.use_store(None)
+        print(mod.f(3))
+    ''', name='main.py')
+    # the module itself isn't touched
+    source = mod.source
+    assert main.run({}).stdout.split('\n')[-2] == '(4, 6)'
+    assert mod.source == source
+
+
+def test_freeze_positional_mode(script):
+    mod = script('''
+        from todo import set_placeholder
+
+        def f(x):
+            set_placeholder('z', 'statement')
+            return z
+    ''', name='mod.py')
+    store = FillStore(os.path.join(mod.dir, 'fills.jsonl'))
+    store.put(mod.path, 'statement', 'z', 'z = x * 2')
+    # same key, other mode: not this site's
+    store.put(mod.path, 'expression', 'z', '"wrong"')
+    main = script('''
+        import os
+        import todo
+        todo.freeze('fills.jsonl')
+        import mod
+        os.remove('fills.jsonl')
+        todo.use_store(None)
+        print(mod.f(3))
+    ''', name='main.py')
+    assert main.run({}).stdout.split('\n')[-2] == '6'
@@ -0,0 +1,95 @@
+"""
+Fills thrown out when their source changes, and the bounded fill cache.
+"""
+
+
+def test_anonymous_lambdas_remembered_apart(script):
+    app = script('''
+        import todo
+        todo.cache_fills(remember_anonymous=True)
+        f = lambda: todo.set_placeholder(rewrite_source=False)
+        g = lambda: todo.set_placeholder(rewrite_source=False)
+        h, i = (
+            lambda: todo.set_placeholder(rewrite_source=False),
+            lambda: todo.set_placeholder(rewrite_source=False),
+        )
+        print(f(), g(), f(), g(), h(), i(), h(), i())
+    ''')
+    proc = app.run({'<anonymous>': [['"F"'], ['"G"'], ['1'], ['2']]})
+    assert proc.stdout.split()[-8:] == [
+        'F', 'G', 'F', 'G', '1', '2', '1', '2',
+    ]
+
+
+def test_reload_with_unchanged_code(script):
+    script('''
+        import todo
+
+        def f():
+            return todo.set_placeholder('k', rewrite_source=False)
+    ''', name='mod.py')
+    main = script('''
+        import importlib
+        import mod
+        first = mod.f()
+        # an edit that leaves f's code as it was
+        with open(mod.__file__, 'a') as out_f:
+            out_f.write('\\nEDITED = True\\n')
+        importlib.reload(mod)
+        print(first, mod.f(), mod.f())
+    ''', name='main.py')
+    proc = main.run({'k': [['1'], ['2']]})
+    assert proc.stdout.split()[-3:] == ['1', '2', '2']
+
+
+def test_store_fill_made_stale_by_an_edit(script):
+    script('''
+        import todo
+
+        def f():
+            return todo.set_placeholder('k', rewrite_source=False)
+    ''', name='mod.py')
+    main = script('''
+        import importlib
+        import todo
+        todo.use_store('fills.jsonl')
+        import mod
+        first = mod.f()
+        with open(mod.__file__, 'a') as out_f:
+            out_f.write('\\nEDITED = True\\n')
+        importlib.reload(mod)
+        print(first, mod.f())
+    ''', name='main.py')
+    proc = main.run({'k': [['1'], ['2']]})
+    assert proc.stdout.split()[-2:] == ['1', '2']
+
+
+def test_store_fill_kept_through_a_rewrite(script):
+    app = script('''
+        import todo
+        todo.use_store('fills.jsonl')
+        x = todo.set_placeholder('x')
+        y = todo.set_placeholder('y', rewrite_source=False)
+        print(x, y)
+    ''')
+    app.run({'x': ['1'], 'y': ['2']})
+    assert 'x = 1\n' in app.source
+    # y was stored before x's rewrite changed the file, and still counts
+    assert app.run({}).stdout.split() == ['1', '2']
+
+
+def test_long_running_process_keeps_no_leftovers(script):
+    app = script('''
+        import gc
+        import todo
+        from todo import placeholder
+        todo.cache_fills(2)
+        for i in range(20):
+            p = todo.Placeholder(rewrite_source=False)
+            todo.set_placeholder('k{}'.format(i), rewrite_source=False)
+        gc.collect()
+        print(len(placeholder.default_object_sessions))
+        print(len(placeholder._call_accessors))
+    ''')
+    proc = app.run({'k{}'.format(i): ['1'] for i in range(20)})
+    assert proc.stdout.split()[-2:] == ['1', '2']
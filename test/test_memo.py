@@ -0,0 +1,137 @@
+import builtins
+from types import SimpleNamespace
+
+import pytest
+
+from todo import set_placeholder
+from todo.placeholder import FillMemo
+
+
+def frame(**f_locals):
+    return SimpleNamespace(
+        f_locals=f_locals, f_globals={}, f_builtins=vars(builtins)
+    )
+
+
+def test_names():
+    memo = FillMemo('y = f(x) + len([i for i in z])', True)
+    assert memo.free == ('f', 'i', 'len', 'x', 'z')
+    assert memo.bound == ('y',)
+
+    memo = FillMemo('def g(a):\n    b = a\nfor k in v: pass', True)
+    assert memo.bound == ('g', 'k')
+    assert memo.free == ('a', 'v')
+
+
+def test_size():
+    assert FillMemo('x', True).size == FillMemo.default_size
+    assert FillMemo('x', 3).size == 3
+    with pytest.raises(ValueError):
+        FillMemo('x', 0.5)
+
+
+def test_key():
+    memo = FillMemo('x + len(y)', True)
+    key, pinned, _ = memo.snapshot(frame(x=1, y=[1]))
+    assert key[0] == (type(len), len)
+    assert key[1] == (int, 1)
+    # lists are keyed on identity and kept alive with the result
+    assert key[2][0] is None
+    assert len(pinned) == 1
+
+    # 1 == 1.0 == True, but they aren't the same input
+    keys = {memo.snapshot(frame(x=x, y=()))[0] for x in (1, 1.0, True)}
+    assert len(keys) == 3
+
+
+def test_updates_and_lru():
+    memo = FillMemo('y = x * 2', 2)
+    for x in (1, 2, 3):
+        f = frame(x=x, y=0)
+        snapshot = memo.snapshot(f)
+        f.f_locals['y'] = x * 2
+        memo.store(f, snapshot, None)
+    assert len(memo.results) == 2
+    assert [updates for _, updates, _ in memo.results.values()] == [
+        {'y': 4}, {'y': 6},
+    ]
+
+
+calls = []
+
+
+def count(x):
+    calls.append(x)
+    return x * 10
+
+
+def test_memoized_fill(answers):
+    answers({'test_memoized_fill': ['count(x)']})
+
+    def f(x):
+        return set_placeholder(
+            'test_memoized_fill', memoize=True, rewrite_source=False
+        )
+
+    del calls[:]
+    assert [f(x) for x in (1, 1, 2, 1, 2)] == [10, 10, 20, 10, 20]
+    assert calls == [1, 2]
+
+
+def test_memoized_statement(answers):
+    answers({'test_memoized_statement': ['y = count(x)']})
+
+    def g(x):
+        y = None
+        set_placeholder(
+            'test_memoized_statement', replace_mode='statement',
+            memoize=True, rewrite_source=False,
+        )
+        return y
+
+    del calls[:]
+    assert [g(x) for x in (3, 4, 3)] == [30, 40, 30]
+    assert calls == [3, 4]
+
+
+def test_augmented_assignment_reads_its_target():
+    memo = FillMemo('x += 1\ndel y\nz.a += 1\nw[0] += 1', True)
+    assert memo.free == ('w', 'x', 'y', 'z')
+    assert memo.bound == ('x', 'y')
+
+
+def test_deletions_arent_kept():
+    memo = FillMemo('del y', True)
+    f = frame(y=1)
+    snapshot = memo.snapshot(f)
+    del f.f_locals['y']
+    memo.store(f, snapshot, None)
+    assert memo.results == {}
+
+
+def test_memoized_augmented_assignment(answers):
+    answers({'test_memoized_augmented_assignment': ['x += 1']})
+
+    def g(x):
+        set_placeholder(
+            'test_memoized_augmented_assignment', replace_mode='statement',
+            memoize=True, rewrite_source=False,
+        )
+        return x
+
+    assert [g(x) for x in (1, 5, 10, 5)] == [2, 6, 11, 6]
+
+
+def test_unhashable_inputs_are_told_apart_by_identity(answers):
+    answers({'test_unhashable_inputs': ['count(len(x))']})
+
+    def f(x):
+        return set_placeholder(
+            'test_unhashable_inputs', memoize=True, rewrite_source=False
+        )
+
+    a, b = [1, 2], [1, 2]
+    del calls[:]
+    assert [f(x) for x in (a, a, b, a)] == [20, 20, 20, 20]
+    # equal, but not the same list
+    assert calls == [2, 2]
@@ -0,0 +1,35 @@
+"""
+todo.prefill: every fill asked for before the run starts.
+"""
+
+
+def test_prefill_on_import(script):
+    app = script('''
+        import todo
+        print('running')
+        a = todo.set_placeholder('a', rewrite_source=False)
+        todo.set_placeholder('b', 'statement', rewrite_source=False)
+        print('got', a, b)
+    ''')
+    proc = app.run(
+        {'a': ['10'], 'b': ['b = 20']}, env={'TODO_PLACEHOLDER_PREFILL': '1'},
+    )
+    # the session echoes 10 before the script is running
+    assert proc.stdout.split() == ['10', 'running', 'got', '10', '20']
+    assert proc.stderr.count('Entering') == 2
+
+
+def test_failed_site_is_left_to_ask_when_hit(script):
+    app = script('''
+        import todo
+        from todo import placeholder
+        from todo.inputs import ScriptedInput
+        placeholder.default_input = ScriptedInput({'b': ['20']})
+        a = todo.set_placeholder('a', rewrite_source=False)
+        b = todo.set_placeholder('b', rewrite_source=False)
+        print('got', a, b)
+    ''')
+    # nothing to answer 'b' with at import
+    proc = app.run({'a': ['10']}, env={'TODO_PLACEHOLDER_PREFILL': '1'})
+    assert proc.stdout.splitlines()[-1] == 'got 10 20'
+    assert 'Could not prefill "b"' in proc.stderr
@@ -0,0 +1,57 @@
+"""
+`python -m todo scan`: placeholder sites found without running anything.
+"""
+import json
+import os
+
+from todo import scan
+from todo.store import FillStore
+
+
+def scan_json(app, *args):
+    proc = app.python('-m', 'todo', 'scan', '--json', *args)
+    return [
+        (row['mode'], row['owner'], row['key'], row['state'])
+        for row in json.loads(proc.stdout)['sites']
+    ]
+
+
+def test_scan(script):
+    app = script('''
+        import todo
+        p = todo.StatementPlaceholder()
+        x = todo.set_placeholder('x')
+        todo.set_placeholder('s', 'statement')
+        p.run
+        todo.set_placeholder()
+    ''')
+    store = FillStore(os.path.join(app.dir, 'fills.jsonl'))
+    store.put(app.path, 'statement', 's', 'pass')
+    # the same key in the wrong mode doesn't count
+    store.put(app.path, 'expression', 'run', '1', owner='p')
+    assert scan_json(app, '--store', 'fills.jsonl') == [
+        ('expression', None, 'x', 'unfilled'),
+        ('statement', None, 's', 'filled'),
+        ('statement', 'p', 'run', 'unfilled'),
+        ('expression', None, None, 'anonymous'),
+    ]
+
+
+def test_old_cache_is_ignored(script):
+    app = script('''
+        import todo
+        todo.set_placeholder('s', 'statement')
+    ''')
+    scan_json(app)
+    cache_path = os.path.join(app.dir, scan.DEFAULT_CACHE)
+    with open(cache_path) as in_f:
+        cache = json.load(in_f)
+    assert cache['version'] == scan.CACHE_VERSION
+
+    # what an older version found, under a stamp that's still current
+    [entry] = cache['files'].values()
+    entry['result']['sites'][0]['mode'] = 'expression'
+    cache['version'] = scan.CACHE_VERSION - 1
+    with open(cache_path, 'w') as out_f:
+        json.dump(cache, out_f)
+    assert scan_json(app) == [('statement', None, 's', 'unfilled')]
@@ -0,0 +1,140 @@
+import ast
+import textwrap
+
+from todo import sites
+
+
+def found(source: str):
+    tree = ast.parse(textwrap.dedent(source))
+    return [
+        (site.kind, site.mode, site.owner, site.key, site.lineno)
+        for site in sites.find_sites(tree)
+    ]
+
+
+def test_calls():
+    assert found('''
+        from todo import set_placeholder, aset_placeholder
+        x = set_placeholder('a')
+        set_placeholder('b', replace_mode='statement')
+        set_placeholder(replace_mode='multiline')
+        set_placeholder(key)
+        async def f():
+            await aset_placeholder('c')
+    ''') == [
+        ('call', 'expression', None, 'a', 3),
+        ('call', 'statement', None, 'b', 4),
+        ('call', 'multiline', None, None, 5),
+        ('await', 'expression', None, 'c', 8),
+    ]
+
+
+def test_positional_mode():
+    assert found('''
+        from todo import set_placeholder, aset_placeholder
+        set_placeholder('s', 'statement')
+        set_placeholder('m', 'multiline', False)
+        set_placeholder('e', None)
+        set_placeholder('x', mode)
+        set_placeholder(*args)
+        set_placeholder('k', **options)
+        set_placeholder('bad', 'nonsense')
+        async def f():
+            await aset_placeholder('a', 'statement')
+    ''') == [
+        ('call', 'statement', None, 's', 3),
+        ('call', 'multiline', None, 'm', 4),
+        ('call', 'expression', None, 'e', 5),
+        ('await', 'statement', None, 'a', 11),
+    ]
+
+
+def test_attributes_by_scope():
+    keys = [site[3] for site in found('''
+        import todo
+        p = todo.Placeholder()
+        q = todo.Placeholder()
+        q = 5
+        r = todo.Placeholder()
+        p.top
+        def f(p): return p.arg
+        def g(): return p.ok_g
+        def h():
+            p = 1
+            return p.local
+        def k():
+            def inner(): return p.closure_hidden
+            p = 2
+            return inner
+        class C:
+            p = 3
+            a = p.class_hidden
+            def m(self): return p.ok_method
+        lam = lambda p: p.lambda_hidden
+        lam2 = lambda: p.ok_lambda
+        lst = [p.comp_hidden for p in range(3)]
+        lst2 = [x for x in p.ok_iter]
+        q.ambiguous
+        def w():
+            global r
+            r = None
+        r.rebound
+        def d(x=p.ok_default): pass
+        def imp():
+            import os as p
+            return p.import_hidden
+        def exc():
+            try: pass
+            except E as p: return p.except_hidden
+        def nl():
+            p = 0
+            def inner():
+                nonlocal p
+                return p.nonlocal_hidden
+        def walrus():
+            [(p := 1) for _ in ()]
+            return p.walrus_hidden
+        def rd():
+            global p
+            return p.ok_global_read
+    ''')]
+    assert keys == [
+        'top', 'ok_g', 'ok_method', 'ok_lambda', 'ok_iter', 'ok_default',
+        'ok_global_read',
+    ]
+
+
+def test_attribute_modes():
+    assert found('''
+        from todo import *
+        e = ExpressionPlaceholder()
+        s = StatementPlaceholder()
+        m = MultilinePlaceholder()
+        e.a
+        s.b
+        m.c
+    ''') == [
+        ('attr', 'expression', 'e', 'a', 6),
+        ('attr', 'statement', 's', 'b', 7),
+        ('attr', 'multiline', 'm', 'c', 8),
+    ]
+
+
+def test_bound_name_at(tmp_path):
+    path = tmp_path / 'a.py'
+    path.write_text(textwrap.dedent('''
+        import todo
+        p = todo.Placeholder(
+            rewrite_source=False,
+        )
+        q, r = todo.Placeholder(), 1
+    '''))
+    assert sites.bound_name_at(str(path), 3) == 'p'
+    assert sites.bound_name_at(str(path), 4) == 'p'
+    assert sites.bound_name_at(str(path), 6) is None
+    assert sites.bound_name_at(str(tmp_path / 'missing.py'), 1) is None
+
+
+def test_may_have_sites():
+    assert not sites.may_have_sites(b'print(1)\n')
+    assert sites.may_have_sites(b'from todo import set_placeholder\n')
@@ -0,0 +1,38 @@
+"""
+Snapshot mode: a placeholder hit with nobody to ask is saved, filled offline
+with `python -m todo fill`, and picked up from the store on the next run.
+"""
+import os
+
+
+def test_snapshots(script):
+    app = script('''
+        import sys
+        import todo
+        if len(sys.argv) > 1:
+            todo.use_store(sys.argv[1])
+        todo.use_snapshots('snaps')
+        p = todo.Placeholder(rewrite_source=False)
+        n = 4
+        try:
+            print(p.k)
+        except RuntimeError as e:
+            print('error:', e)
+    ''')
+    snaps = os.path.join(app.dir, 'snaps')
+
+    # nowhere for a fill to come back through
+    proc = app.run()
+    assert 'error:' in proc.stdout
+    assert not os.path.exists(snaps)
+
+    proc = app.run(args=['fills.jsonl'])
+    assert 'error:' in proc.stdout
+    [name] = os.listdir(snaps)
+    assert '-p.k-' in name
+
+    app.python(
+        '-m', 'todo', 'fill', os.path.join(snaps, name),
+        answers={'k': ['n * 2']},
+    )
+    assert app.run(args=['fills.jsonl']).stdout.split() == ['8']
@@ -0,0 +1,79 @@
+import os
+import stat
+
+import pytest
+
+from todo.splice import SourceFile
+
+
+def write(path, data: bytes) -> str:
+    with open(path, 'wb') as out_f:
+        out_f.write(data)
+    return str(path)
+
+
+def read(path) -> bytes:
+    with open(path, 'rb') as in_f:
+        return in_f.read()
+
+
+def test_lines(tmp_path):
+    path = write(tmp_path / 'a.py', b'one\ntwo\nthree')
+    with SourceFile(path) as source:
+        assert source.line(0) == 'one\n'
+        assert source.line(2) == 'three'
+        assert source.line_span(1) == (4, 8)
+        with pytest.raises(IndexError):
+            source.line(3)
+
+
+def test_splice(tmp_path):
+    path = write(tmp_path / 'a.py', b'a\nb\nc\nd\n')
+    with SourceFile(path) as source:
+        source.splice({1: 'B1\nB2\n', 3: '', 0: 'A\n'})
+    assert read(path) == b'A\nB1\nB2\nc\n'
+
+
+def test_splice_last_line_without_newline(tmp_path):
+    path = write(tmp_path / 'a.py', b'a\r\nb')
+    with SourceFile(path) as source:
+        source.splice({1: 'x'})
+    assert read(path) == b'a\r\nx'
+
+
+def test_splice_utf8(tmp_path):
+    path = write(tmp_path / 'a.py', 'é = 1\nprint("ü")\n'.encode('utf-8'))
+    with SourceFile(path) as source:
+        assert source.line(1) == 'print("ü")\n'
+        source.splice({1: 'print("∂")\n'})
+    assert read(path).decode('utf-8') == 'é = 1\nprint("∂")\n'
+
+
+def test_splice_empty_file(tmp_path):
+    path = write(tmp_path / 'a.py', b'')
+    with SourceFile(path) as source:
+        source.splice({})
+    assert read(path) == b''
+
+
+def test_splice_keeps_mode_and_follows_symlinks(tmp_path):
+    target = write(tmp_path / 'a.py', b'a\nb\n')
+    os.chmod(target, 0o751)
+    link = tmp_path / 'link.py'
+    link.symlink_to(target)
+    with SourceFile(str(link)) as source:
+        source.splice({0: 'x\n'})
+    assert link.is_symlink()
+    assert read(target) == b'x\nb\n'
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o751
+    # nothing left behind
+    assert sorted(os.listdir(tmp_path)) == ['a.py', 'link.py']
+
+
+def test_splice_failure_leaves_the_file(tmp_path):
+    path = write(tmp_path / 'a.py', b'a\nb\n')
+    with SourceFile(path) as source:
+        with pytest.raises(IndexError):
+            source.splice({0: 'x\n', 5: 'y\n'})
+    assert read(path) == b'a\nb\n'
+    assert os.listdir(tmp_path) == ['a.py']
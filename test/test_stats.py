@@ -0,0 +1,24 @@
+def test_stats_reported_once(script):
+    app = script('''
+        import todo
+        todo.instrument(report_at_exit=True)
+        todo.instrument(report_at_exit=True)
+        print(todo.set_placeholder('k', rewrite_source=False))
+    ''')
+    proc = app.run({'k': ['1']})
+    assert (proc.stdout + proc.stderr).count('placeholder stats:') == 1
+
+
+def test_stats(script):
+    app = script('''
+        import todo
+        todo.instrument()
+        for i in range(3):
+            todo.set_placeholder('k', rewrite_source=False)
+        print({entry['phase']: entry['count'] for entry in todo.stats(key='k')})
+    ''')
+    proc = app.run({'k': ['i']})
+    # the first hit takes its value from the session
+    assert proc.stdout.splitlines()[-1] == str(
+        {'access': 3, 'prompt': 1, 'evaluate': 2}
+    )
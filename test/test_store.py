@@ -0,0 +1,181 @@
+import json
+import os
+
+from todo.store import FillStore
+
+
+def append(path, data: bytes) -> None:
+    with open(path, 'ab') as out_f:
+        out_f.write(data)
+
+
+def record(key: str, fill, **extra) -> bytes:
+    data = dict(file=os.path.abspath('a.py'), mode='expression', key=key,
+                fill=fill, **extra)
+    return (json.dumps(data) + '\n').encode('utf-8')
+
+
+def test_put_get(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    FillStore(path).put('a.py', 'expression', 'x', 'x + 1')
+    FillStore(path).put('a.py', 'statement', 'x', ['x += 1', 'y = x'])
+
+    store = FillStore(path)
+    assert store.get('a.py', 'expression', 'x') == 'x + 1'
+    assert store.get('a.py', 'statement', 'x') == ['x += 1', 'y = x']
+    assert store.get('b.py', 'expression', 'x') is None
+
+
+def test_last_record_wins(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    FillStore(path).put('a.py', 'expression', 'x', '1')
+    FillStore(path).put('a.py', 'expression', 'x', '2')
+    assert FillStore(path).get('a.py', 'expression', 'x') == '2'
+
+
+def test_owners_are_kept_apart(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    writer = FillStore(path)
+    writer.put('a.py', 'expression', 'k', 'call')
+    writer.put('a.py', 'expression', 'k', 'p', owner='p')
+    writer.put('a.py', 'expression', 'k', 'q', owner='q')
+
+    store = FillStore(path)
+    assert store.get('a.py', 'expression', 'k') == 'call'
+    assert store.get('a.py', 'expression', 'k', owner='p') == 'p'
+    assert store.get('a.py', 'expression', 'k', owner='q') == 'q'
+    assert store.get('a.py', 'expression', 'k', owner='r') is None
+
+
+def test_records_without_owner(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    append(path, record('x', 'old'))
+    assert FillStore(path).get('a.py', 'expression', 'x') == 'old'
+
+
+def test_torn_record(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    data = record('x', 'x + 1')
+    append(path, record('y', 'y + 1') + data[:10])
+
+    store = FillStore(path)
+    assert store.get('a.py', 'expression', 'y') == 'y + 1'
+    assert store.get('a.py', 'expression', 'x') is None
+
+    # the writer gets the rest of it out
+    append(path, data[10:])
+    assert store.get('a.py', 'expression', 'x') == 'x + 1'
+
+
+def test_garbage_is_skipped(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    append(path, record('x', '1') + b'{"file": \n' + b'[]\n' + record('y', '2'))
+    store = FillStore(path)
+    assert store.get('a.py', 'expression', 'x') == '1'
+    assert store.get('a.py', 'expression', 'y') == '2'
+
+
+def test_only_new_records_are_parsed(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    store = FillStore(path)
+    store.load()  # no log yet
+    append(path, record('x', '1'))
+    store.load()
+    loaded = store._loaded
+    assert loaded == os.path.getsize(path)
+
+    append(path, record('y', '2'))
+    store.load()
+    assert store._loaded == os.path.getsize(path)
+    assert store.fills[(os.path.abspath('a.py'), 'expression', 'y', None)] \
+        == ('2', None)
+
+
+def test_replaced_log(tmp_path):
+    path = str(tmp_path / 'fills.jsonl')
+    append(path, record('x', '1') + record('y', '2'))
+    store = FillStore(path)
+    store.load()
+
+    os.remove(path)
+    append(path, record('z', '3'))
+    assert store.get('a.py', 'expression', 'z') == '3'
+
+
+def test_store_keeps_owners_apart(script):
+    app = script('''
+        import todo
+        todo.use_store('fills.jsonl')
+        p = todo.Placeholder(rewrite_source=False)
+        q = todo.Placeholder(rewrite_source=False)
+        print(todo.set_placeholder('k', rewrite_source=False), p.k, q.k)
+    ''')
+    answers = {'k': [['"call"'], ['"p"'], ['"q"']]}
+    assert app.run(answers).stdout.split()[-3:] == ['call', 'p', 'q']
+    # and they're all found again
+    assert app.run({}).stdout.split() == ['call', 'p', 'q']
+
+
+def test_edited_source_makes_fills_stale(tmp_path):
+    source = tmp_path / 'a.py'
+    source.write_text('x = 1\n')
+    path = str(tmp_path / 'fills.jsonl')
+    FillStore(path).put(str(source), 'expression', 'x', '1')
+    assert FillStore(path).get(str(source), 'expression', 'x') == '1'
+
+    source.write_text('x = 2\n')
+    store = FillStore(path)
+    assert store.get(str(source), 'expression', 'x') is None
+    assert store.fills_for(str(source)) == {}
+
+
+def test_own_rewrites_keep_fills(tmp_path):
+    source = tmp_path / 'a.py'
+    source.write_text('x = 1\n')
+    path = str(tmp_path / 'fills.jsonl')
+    writer = FillStore(path)
+    writer.put(str(source), 'expression', 'x', '1')
+
+    for text in ('x = 2\n', 'x = 3\n'):
+        st = os.stat(source)
+        source.write_text(text)
+        writer.note_rewrite(str(source), (st.st_mtime_ns, st.st_size))
+    assert writer.get(str(source), 'expression', 'x') == '1'
+    # in another process, too
+    store = FillStore(path)
+    assert store.get(str(source), 'expression', 'x') == '1'
+    assert store.fills_for(str(source)) == {('expression', 'x', None): '1'}
+
+    # but not through someone else's edit
+    source.write_text('x = 4\n')
+    assert store.get(str(source), 'expression', 'x') is None
+
+
+def test_rewrite_of_an_unhashed_file_isnt_linked(tmp_path):
+    source = tmp_path / 'a.py'
+    source.write_text('x = 1\n')
+    path = str(tmp_path / 'fills.jsonl')
+    FillStore(path).put(str(source), 'expression', 'x', '1')
+
+    store = FillStore(path)
+    st = os.stat(source)
+    source.write_text('x = 2\n')
+    # it never saw the file before the write, so it can't vouch for it
+    store.note_rewrite(str(source), (st.st_mtime_ns, st.st_size))
+    assert store.get(str(source), 'expression', 'x') is None
+
+
+def test_object_owner_after_a_rewrite_above_it(script):
+    app = script('''
+        import todo
+        todo.use_store('fills.jsonl')
+        todo.set_placeholder('pre', 'multiline')
+        p = todo.Placeholder(rewrite_source=False)
+        print(p.k)
+    ''')
+    # two lines in place of one, so `p` is a line further down in the file
+    # than in the code that made it
+    proc = app.run({'pre': ['!a = 1', '!b = 2'], 'k': ['"stored"']})
+    assert proc.stdout.split()[-1] == 'stored'
+    assert 'b = 2\np = todo' in app.source
+    assert app.run({}).stdout.split() == ['stored']
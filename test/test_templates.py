@@ -0,0 +1,71 @@
+"""
+The templates, run start to finish with scripted answers.
+"""
+
+
+def test_basic(template):
+    script = template('basic')
+    proc = script.run({'y': ['x + 1']})
+    assert 'Good!' in proc.stdout
+    assert 'if x + 1 != 2:' in script.source
+    assert 'if x + 1 == 3:' in script.source
+    # never hit, so never rewritten
+    assert "format(placeholder.y)" in script.source
+
+
+def test_set_placeholder(template):
+    script = template('set_placeholder')
+    proc = script.run({'x': ['x + 1']})
+    assert 'Good!' in proc.stdout
+    assert "set_placeholder('x')" not in script.source
+    assert script.source.count('if x + 1') == 2
+
+
+def test_set_placeholder_anonymous(template):
+    script = template('set_placeholder_anonymous')
+    # every anonymous hit gets a session of its own
+    proc = script.run({'<anonymous>': [['x + 1'], ['x + 1']]})
+    assert 'Good!' in proc.stdout
+    assert 'if x + 1 != 2:' in script.source
+    assert 'if x + 1 == 3:' in script.source
+
+
+def test_set_placeholder_parens(template):
+    script = template('set_placeholder_parens')
+    proc = script.run({')))': ['x + 1']})
+    assert 'Good!' in proc.stdout
+    assert 'if x + 1 != 2:' in script.source
+
+
+def test_multiline(template):
+    script = template('multiline')
+    proc = script.run({
+        'incr_xy': ['!x = x + 1', 'print("not recorded")', '!y = y - 1'],
+    })
+    assert 'Good!' in proc.stdout
+    assert 'placeholder.incr_xy' not in script.source
+    assert script.source.count('\nx = x + 1\ny = y - 1\n') == 2
+    assert 'not recorded' not in script.source
+
+
+def test_propagate_needs_allow_propagation(template):
+    script = template('propagate')
+    original = script.source
+    proc = script.run({'y': ['1']}, check=False)
+    assert proc.returncode != 0
+    assert 'allow_propagation' in proc.stderr
+    assert script.source == original
+
+
+def test_store_skips_the_prompt(template):
+    script = template('set_placeholder')
+    original = script.source
+    env = {'TODO_PLACEHOLDER_STORE': 'fills.jsonl'}
+    script.run({'x': ['x + 1']}, env=env)
+
+    with open(script.path, 'w') as out_f:
+        out_f.write(original)
+    # no answers this time, a prompt would fail
+    proc = script.run({}, env=env)
+    assert 'Good!' in proc.stdout
+    assert 'if x + 1 != 2:' in script.source
@@ -0,0 +1,68 @@
+"""
+Filling from several threads: one prompt per key, however many hit it.
+"""
+
+
+def test_one_prompt_across_threads(script):
+    app = script('''
+        import threading
+        import todo
+
+        def work(i):
+            results[i] = todo.set_placeholder('k', rewrite_source=False)
+
+        results = [None] * 8
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(results)
+    ''')
+    # a second prompt would have no answers left, and fail
+    proc = app.run({'k': ['__import__("time").sleep(0.5)', '41 + 1']})
+    assert proc.stdout.splitlines()[-1] == str([42] * 8)
+
+
+def test_retry_after_a_failed_rewrite(script):
+    app = script('''
+        import todo
+        from todo import placeholder
+        locate = placeholder.RewriteContext.locate
+        calls = []
+        def flaky(self, *args):
+            calls.append(1)
+            if len(calls) == 1:
+                raise ValueError('flaky')
+            return locate(self, *args)
+        placeholder.RewriteContext.locate = flaky
+        for i in range(2):
+            try:
+                print('got', todo.set_placeholder('k'))
+            except ValueError as e:
+                print('failed', e)
+    ''')
+    proc = app.run({'k': ['41 + 1']})
+    assert 'failed flaky' in proc.stdout
+    assert 'got 42' in proc.stdout
+    # the second hit still rewrites the site
+    assert "print('got', 41 + 1)" in app.source
+
+
+def test_recursive_fill_in_the_same_thread(script):
+    app = script('''
+        import todo
+
+        def fib(n):
+            if n < 2:
+                return n
+            return todo.set_placeholder('rec')
+
+        print(fib(6))
+    ''')
+    # trying the fill out in its session hits the same key again, which gets
+    # a nested session instead of waiting on the one it's nested in
+    line = 'fib(n - 1) + fib(n - 2)'
+    proc = app.run({'rec': [[line]] * 5})
+    assert proc.stdout.splitlines()[-1] == '8'
+    assert 'return fib(n - 1) + fib(n - 2)' in app.source
@@ -1,7 +1,29 @@
 from todo.placeholder import (
     set_placeholder,
+    aset_placeholder,
+    map_placeholder,
+    flush,
+    defer_rewrites,
+    use_store,
+    use_snapshots,
+    set_input,
+    instrument,
+    stats,
+    cache_fills,
+    ScriptedInput,
+    StreamInput,
     Placeholder,
     ExpressionPlaceholder,
     StatementPlaceholder,
     MultilinePlaceholder,
 )
+
+
+def __getattr__(name):
+    # these pull in sockets, pickling or the ast module, so they're only
+    # loaded on use
+    if name in placeholder._lazy_exports:
+        return getattr(placeholder, name)
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name)
+    )
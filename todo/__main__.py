@@ -0,0 +1,36 @@
+"""
+Command line tools for placeholder.
+
+    python -m todo scan [paths...]
+    python -m todo fill <snapshot>
+"""
+import argparse
+import sys
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m todo')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    from todo import scan
+    scan_parser = commands.add_parser(
+        'scan', help='list placeholder sites in a source tree',
+        description=scan.__doc__.strip().split('\n')[0],
+    )
+    scan.add_arguments(scan_parser)
+    scan_parser.set_defaults(run=scan.run)
+
+    from todo import snapshot
+    fill_parser = commands.add_parser(
+        'fill', help='fill a placeholder from a frame snapshot',
+        description=snapshot.__doc__.strip().split('\n')[0],
+    )
+    snapshot.add_arguments(fill_parser)
+    fill_parser.set_defaults(run=snapshot.run)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
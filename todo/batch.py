@@ -0,0 +1,171 @@
+"""
+Batch prompting: ask for every fill a run is going to need before it starts.
+
+`todo.prefill()` finds the placeholder sites in the script being run and the
+local modules it imports (or in whatever paths it's given), and opens the
+sessions for all unfilled ones right away, grouped by file and mode. The
+program then runs to the end without stopping to ask.
+
+The sessions run without the site's variables, since nothing has run yet; the
+last line typed is taken as the fill whether or not it worked there. A site that
+can't be prefilled is warned about and left to ask when it's hit.
+"""
+import ast
+import os
+import sys
+import warnings
+from typing import *
+
+from todo import sites
+
+
+def _module_file(base: str, dotted: str) -> Optional[str]:
+    path = os.path.join(base, *dotted.split('.'))
+    for candidate in (path + '.py', os.path.join(path, '__init__.py')):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def local_imports(fname: str, root: str) -> List[str]:
+    """
+    Source files under `root` that `fname` imports, found by file name only
+    (nothing gets imported).
+    """
+    with open(fname, 'rb') as in_f:
+        tree = ast.parse(in_f.read(), fname)
+
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                parts = alias.name.split('.')
+                # `import a.b` runs a/__init__.py too
+                modules += [
+                    (root, '.'.join(parts[:i + 1])) for i in range(len(parts))
+                ]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = os.path.dirname(fname)
+                for _ in range(node.level - 1):
+                    base = os.path.dirname(base)
+            else:
+                base = root
+            if node.module:
+                modules.append((base, node.module))
+            prefix = node.module + '.' if node.module else ''
+            # `from a import b` may be importing the submodule a.b
+            modules += [(base, prefix + alias.name) for alias in node.names]
+
+    found = []
+    for base, dotted in modules:
+        path = _module_file(base, dotted)
+        if path is not None:
+            found.append(os.path.abspath(path))
+    return found
+
+
+def script_files(script: str) -> List[str]:
+    """
+    `script` and every local module it imports, directly or not.
+    """
+    script = os.path.abspath(script)
+    root = os.path.dirname(script)
+    seen = [script]
+    queue = [script]
+    while queue:
+        try:
+            imported = local_imports(queue.pop(), root)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for path in imported:
+            if path not in seen:
+                seen.append(path)
+                queue.append(path)
+    return seen
+
+
+GroupT = Tuple[str, str, Optional[str]]
+
+
+def pending_sites(files: Iterable[str]) -> Dict[GroupT, List[str]]:
+    """
+    (file, mode, owner) -> keys with no fill yet, in source order. The owner is
+    None for `set_placeholder` calls, and the placeholder object's name for
+    attribute sites.
+    """
+    from todo import placeholder
+
+    groups = {}
+    for fname in files:
+        try:
+            found = sites.find_sites_in_file(fname)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for site in found:
+            if site.key is None:
+                continue  # anonymous, nothing to remember it by
+            keys = groups.setdefault((fname, site.mode, site.owner), [])
+            if site.key in keys or placeholder.known_fill(
+                    fname, site.mode, site.key, site.owner
+            ) is not None:
+                continue
+            keys.append(site.key)
+    return {group: keys for group, keys in groups.items() if keys}
+
+
+def prefill(paths: Optional[Iterable[str]] = None) -> int:
+    """
+    Ask for the fill of every unfilled placeholder site up front, and return
+    how many were filled.
+
+    `paths` are files or directories to look in. By default, that's the script
+    being run and the modules it imports from its own directory.
+
+    A fill made here is used by every site with its key: `set_placeholder`
+    calls for a key asked for once for all of them, a placeholder object's
+    attribute once per object. With a fill store (see `todo.use_store`),
+    they're saved to it as well.
+    """
+    from todo import placeholder
+
+    if paths is None:
+        script = getattr(sys.modules.get('__main__'), '__file__', None)
+        if script is None:
+            raise ValueError(
+                'No script to prefill for, pass the paths to look in'
+            )
+        files = script_files(script)
+    else:
+        from todo.scan import iter_source_files
+        files = list(iter_source_files(paths))
+
+    groups = pending_sites(files)
+    total = sum(len(keys) for keys in groups.values())
+    done = 0
+    filled = 0
+    for (fname, mode, owner), keys in groups.items():
+        sys.stderr.write('# prefill {} ({}{}): {}\n'.format(
+            os.path.relpath(fname), mode,
+            '' if owner is None else ', ' + owner, ', '.join(keys),
+        ))
+        for key in keys:
+            done += 1
+            sys.stderr.write('# [{}/{}] {}\n'.format(done, total, key))
+            try:
+                session = placeholder._owner_session(fname, mode, owner)
+                fill = session.request_fill(key, {})
+                session.store_fill(key, fill)
+            except Exception as e:
+                # this may be running inside `import todo`, which shouldn't
+                # fail over a fill the site can still ask for when it's hit
+                warnings.warn(
+                    'Could not prefill "{}" in {}, it will be asked for when '
+                    'it is hit: {!r}'.format(key, os.path.relpath(fname), e),
+                    RuntimeWarning,
+                )
+                continue
+            session.set_fill(key, fill)
+            placeholder.default_prefill[(fname, mode, key, owner)] = fill
+            filled += 1
+    return filled
@@ -0,0 +1,229 @@
+"""
+One terminal for a whole process tree.
+
+A `FillBroker` runs in the parent process and listens on a Unix socket. Worker
+processes (forked or spawned) find it through the environment and send it
+their fill requests instead of opening a session of their own. The parent
+prompts once per key and every worker gets the answer. Workers send their
+source edits to the broker too, which queues them and writes each file once.
+"""
+import os
+import pickle
+import shutil
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from typing import *
+
+from todo.portable import freeze_namespace, thaw_namespace
+
+
+BROKER_ENV = 'TODO_PLACEHOLDER_BROKER'
+
+_header = struct.Struct('>I')
+
+# the broker running in this process, if any (a forked child inherits this
+# too, which is why it's checked against the pid)
+_local_broker: Optional['FillBroker'] = None
+_client: Optional['BrokerClient'] = None
+
+
+def _send(sock: socket.socket, message: Any) -> None:
+    data = pickle.dumps(message)
+    sock.sendall(_header.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv(sock: socket.socket) -> Any:
+    header = _recv_exact(sock, _header.size)
+    if header is None:
+        raise EOFError
+    data = _recv_exact(sock, _header.unpack(header)[0])
+    if data is None:
+        raise EOFError
+    return pickle.loads(data)
+
+
+class _BrokerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = _recv(self.request)
+            except (EOFError, OSError):
+                return
+            try:
+                response = ('ok', self.server.broker.handle(request))
+            except BaseException as e:
+                response = ('error', '{}: {}'.format(type(e).__name__, e))
+            _send(self.request, response)
+
+
+class _BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class FillBroker:
+    """
+    Serve placeholder fills to worker processes from this one.
+
+        with todo.FillBroker():
+            with multiprocessing.Pool(8) as pool:
+                pool.map(work, items)
+
+    While the broker runs, this process defers its own source rewrites so they
+    line up with the edits coming in from workers; everything is written out
+    when the broker stops.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._tmpdir = None
+        if path is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='todo-placeholder-')
+            path = os.path.join(self._tmpdir, 'broker.sock')
+        self.path = path
+        self.pid = os.getpid()
+        self._server = None
+        self._thread = None
+        self._was_deferred = False
+
+    def start(self) -> 'FillBroker':
+        global _local_broker
+        from todo import placeholder
+
+        self._server = _BrokerServer(self.path, _BrokerHandler)
+        self._server.broker = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name='todo-placeholder-broker',
+            daemon=True,
+        )
+        self._thread.start()
+
+        self._was_deferred = placeholder.RewriteContext.deferred
+        placeholder.defer_rewrites(True)
+        os.environ[BROKER_ENV] = self.path
+        _local_broker = self
+        return self
+
+    def stop(self) -> None:
+        global _local_broker
+        from todo import placeholder
+
+        if os.environ.get(BROKER_ENV) == self.path:
+            del os.environ[BROKER_ENV]
+        if _local_broker is self:
+            _local_broker = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        placeholder.defer_rewrites(self._was_deferred)
+
+    def __enter__(self) -> 'FillBroker':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, request: Tuple) -> Any:
+        from todo import placeholder
+
+        op = request[0]
+        if op == 'fill':
+            _, filename, mode, key, owner, frozen = request
+            # placeholder objects' fills stay apart from set_placeholder's
+            session = placeholder._owner_session(filename, mode, owner)
+            if key is None:
+                accessor = placeholder.PlaceholderAccessor(
+                    None, 'anonymous', None
+                )
+            else:
+                accessor = placeholder.PlaceholderAccessor(
+                    key, 'call' if owner is None else 'attr', None
+                )
+            return session.get_fill(accessor, thaw_namespace(frozen))
+        if op == 'rewrite':
+            _, filename, lineno, span, fill, multi = request
+            rewrite_ctx = placeholder._resolve_rewrite_ctx(
+                filename, True, True, None
+            )
+            with rewrite_ctx.lock:
+                rewrite_ctx.add_pending(lineno, span, fill, multi)
+            return None
+        raise ValueError('Unknown broker request {}'.format(op))
+
+
+class BrokerClient:
+    def __init__(self, path: str):
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def _request(self, *request: Any) -> Any:
+        with self._lock:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._sock.connect(self.path)
+            _send(self._sock, request)
+            status, result = _recv(self._sock)
+        if status == 'error':
+            raise RuntimeError('Fill broker failed: {}'.format(result))
+        return result
+
+    def request_fill(
+            self,
+            filename: str,
+            mode: str,
+            key: Optional[str],
+            namespace: Mapping[str, Any],
+            owner: Optional[str] = None,
+    ) -> Any:
+        return self._request(
+            'fill', filename, mode, key, owner, freeze_namespace(namespace)
+        )
+
+    def request_rewrite(
+            self,
+            filename: str,
+            lineno: int,
+            span: Tuple[int, int],
+            fill: Any,
+            multi: bool,
+    ) -> None:
+        self._request('rewrite', filename, lineno, span, fill, multi)
+
+
+def broker_client() -> Optional[BrokerClient]:
+    """
+    The client for the broker this process should send its fills to, or None
+    if there isn't one (or this process is the broker).
+    """
+    global _client
+    path = os.environ.get(BROKER_ENV)
+    if not path:
+        return None
+    if _local_broker is not None and _local_broker.pid == os.getpid():
+        return None
+    pid = os.getpid()
+    if _client is None or _client.path != path or _client.pid != pid:
+        # a fresh connection per process; a forked child mustn't share its
+        # parent's socket
+        _client = BrokerClient(path)
+        _client.pid = pid
+    return _client
@@ -0,0 +1,141 @@
+"""
+The interactive console placeholder sessions run in.
+
+It's `code.InteractiveConsole`, keeping track of what each input did: whether
+it raised, the value it displayed and which names it bound. That's enough to
+tell when the fill's result can be taken from the session as it is, instead of
+running the fill all over again on the first hit.
+"""
+import code
+import sys
+from typing import *
+
+
+_MISSING = object()
+
+
+class Unit:
+    """
+    One complete input: a line, or a block with its continuation lines.
+    """
+
+    __slots__ = ('first', 'count', 'recorded', 'ok', 'value', 'changes', 'deleted')
+
+    def __init__(self):
+        # index of its first line among all lines read, and how many lines
+        self.first = 0
+        self.count = 0
+        # True if every line went into the fill, False if none did, None if
+        # some did
+        self.recorded: Optional[bool] = False
+        # ran without raising (False if it didn't compile, too)
+        self.ok = False
+        # what it displayed, if it's an expression
+        self.value: Any = _MISSING
+        # names it bound, and whether it unbound any
+        self.changes: Dict[str, Any] = {}
+        self.deleted = False
+
+    @property
+    def displayed(self) -> bool:
+        return self.value is not _MISSING
+
+
+class RecordingConsole(code.InteractiveConsole):
+    """
+    `recorded` is the list the session's read function appends fill lines to;
+    a line read without it growing wasn't recorded.
+    """
+
+    def __init__(
+            self,
+            local: Dict[str, Any],
+            readfunc: Callable[[str], str],
+            recorded: List[Any],
+    ):
+        super().__init__(local)
+        self.readfunc = readfunc
+        self.recorded = recorded
+        self.units: List[Unit] = []
+        self.lines_read = 0
+        # a block was abandoned halfway (ctrl+C), so the recorded lines don't
+        # match what ran
+        self.interrupted = False
+        self._pending: List[bool] = []
+        self._seen = len(recorded)
+        self._unit: Optional[Unit] = None
+
+    def raw_input(self, prompt: str = '') -> str:
+        line = self.readfunc(prompt)
+        self.lines_read += 1
+        self._pending.append(len(self.recorded) > self._seen)
+        self._seen = len(self.recorded)
+        return line
+
+    def resetbuffer(self) -> None:
+        # push() resets after every complete input, by which point the unit
+        # has taken its lines; anything left was thrown away
+        if getattr(self, '_pending', None):
+            self.interrupted = True
+            self._pending = []
+        super().resetbuffer()
+
+    def runsource(self, source, filename='<input>', symbol='single') -> bool:
+        self._unit = None
+        more = super().runsource(source, filename, symbol)
+        if not more:
+            unit = self._unit or Unit()
+            flags = self._pending
+            self._pending = []
+            unit.first = self.lines_read - len(flags)
+            unit.count = len(flags)
+            unit.recorded = all(flags) if all(flags) or not any(flags) else None
+            self.units.append(unit)
+        return more
+
+    def runcode(self, code) -> None:
+        unit = self._unit = Unit()
+        before = dict(self.locals)
+        displayhook = sys.displayhook
+
+        def display(value):
+            unit.value = value
+            displayhook(value)
+
+        sys.displayhook = display
+        try:
+            exec(code, self.locals)
+        except SystemExit:
+            raise
+        except BaseException:
+            self.showtraceback()
+        else:
+            unit.ok = True
+        finally:
+            sys.displayhook = displayhook
+            after = self.locals
+            unit.changes = {
+                k: v for k, v in after.items()
+                if before.get(k, _MISSING) is not v and k != '__builtins__'
+            }
+            unit.deleted = any(k not in after for k in before)
+
+    def ran_everything(self) -> bool:
+        """
+        Every line read made it into a unit that finished, i.e. nothing was
+        left half-typed or abandoned.
+        """
+        return not self.interrupted and sum(
+            unit.count for unit in self.units
+        ) == self.lines_read
+
+
+def interact(
+        banner: str,
+        local: Dict[str, Any],
+        readfunc: Callable[[str], str],
+        recorded: List[Any],
+) -> RecordingConsole:
+    console = RecordingConsole(local, readfunc, recorded)
+    console.interact(banner, exitmsg='now exiting InteractiveConsole...')
+    return console
@@ -0,0 +1,184 @@
+"""
+Frozen mode: bake filled placeholders into modules as they're imported.
+
+With `todo.freeze()` on, modules that have saved fills are compiled from a
+rewritten AST where every filled site is replaced by its fill, so they run as
+plain code with no placeholder machinery at all. Nothing is written to disk,
+neither the source nor a .pyc. Sites without a fill (and anonymous ones) are
+left alone and go through the usual runtime path.
+"""
+import ast
+import importlib.abc
+import importlib.machinery
+import os
+import sys
+from typing import *
+
+from todo import sites
+
+
+# (mode, key, owner) -> fill, see `todo.store` for the owner
+FillsT = Dict[Tuple[str, str, Optional[str]], Union[str, List[str]]]
+
+
+def _relocate(nodes: List[ast.AST], old: ast.AST) -> None:
+    # the fill runs where the placeholder was, so tracebacks point there
+    for node in nodes:
+        for child in ast.walk(node):
+            if 'lineno' in child._attributes:
+                ast.copy_location(child, old)
+
+
+def _fill_source(fill: Union[str, List[str]]) -> str:
+    if isinstance(fill, list):
+        return '\n'.join(fill)
+    return fill
+
+
+class FreezeTransformer(ast.NodeTransformer):
+    """
+    Replaces every site that has a fill in `fills`.
+    """
+
+    def __init__(self, tree: ast.AST, fills: FillsT):
+        self.fills = fills
+        # by node, since which attributes are sites depends on their scope
+        self.attrs = {id(site.node): site for site in sites.attr_sites(tree)}
+        self.frozen = 0
+
+    def _site(self, node: ast.AST) -> Optional[sites.StaticSite]:
+        site = sites.call_site(node) or self.attrs.get(id(node))
+        if site is None or site.key is None:
+            return None
+        return site
+
+    def _fill(self, site: sites.StaticSite) -> Optional[Union[str, List[str]]]:
+        return self.fills.get((site.mode, site.key, site.owner))
+
+    def visit_Expr(self, node: ast.Expr) -> Any:
+        site = self._site(node.value)
+        if site is None or site.mode == 'expression':
+            return self.generic_visit(node)
+        fill = self._fill(site)
+        if fill is None:
+            return node
+        body = ast.parse(_fill_source(fill)).body
+        _relocate(body, node)
+        self.frozen += 1
+        return body or ast.copy_location(ast.Pass(), node)
+
+    def _visit_expression(self, node: ast.AST) -> ast.AST:
+        site = self._site(node)
+        if site is None or site.mode != 'expression':
+            # statement fills used for their value still need the runtime
+            return self.generic_visit(node)
+        fill = self._fill(site)
+        if fill is None:
+            return self.generic_visit(node)
+        expr = ast.parse(fill, mode='eval').body
+        _relocate([expr], node)
+        self.frozen += 1
+        return expr
+
+    visit_Call = _visit_expression
+    visit_Await = _visit_expression
+    visit_Attribute = _visit_expression
+
+
+def freeze_source(
+        source: Union[str, bytes],
+        fname: str,
+        fills: FillsT,
+) -> Tuple[ast.Module, int]:
+    """
+    The AST for `source` with the sites filled in `fills` replaced, and the
+    number of sites replaced.
+    """
+    tree = ast.parse(source, fname)
+    transformer = FreezeTransformer(tree, fills)
+    tree = ast.fix_missing_locations(transformer.visit(tree))
+    return tree, transformer.frozen
+
+
+class FrozenLoader(importlib.machinery.SourceFileLoader):
+    def __init__(self, fullname: str, path: str, fills: FillsT):
+        super().__init__(fullname, path)
+        self.fills = fills
+
+    def get_code(self, fullname: str) -> Any:
+        # never the cached bytecode, that's the unfrozen module
+        path = self.get_filename(fullname)
+        tree, _ = freeze_source(self.get_data(path), path, self.fills)
+        return compile(tree, path, 'exec', dont_inherit=True)
+
+
+class FrozenFinder(importlib.abc.MetaPathFinder):
+    """
+    Finds modules the normal way, then swaps in a `FrozenLoader` for any
+    source module that has fills.
+    """
+
+    def __init__(self, fills_for: Callable[[str], FillsT]):
+        self.fills_for = fills_for
+
+    def find_spec(self, fullname, path, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is None or not isinstance(
+                spec.loader, importlib.machinery.SourceFileLoader
+        ):
+            return spec
+        fills = self.fills_for(os.path.abspath(spec.origin))
+        if fills:
+            spec.loader = FrozenLoader(fullname, spec.origin, fills)
+        return spec
+
+
+def saved_fills(fname: str) -> FillsT:
+    """
+    Every fill known for `fname`: from the fill store, if there is one, and
+    from this process's sessions.
+    """
+    from todo import placeholder
+
+    fills = {}
+    if placeholder.default_store is not None:
+        fills.update(placeholder.default_store.fills_for(fname))
+    sessions = list(placeholder.default_session.values())
+    sessions += placeholder.default_object_sessions
+    sessions += placeholder.default_owner_sessions.values()
+    for session in sessions:
+        if session.filename and os.path.abspath(session.filename) == fname:
+            for key, fill in list(session.fills.items()):
+                fills[(session.mode, key, session.owner)] = fill
+    return fills
+
+
+_finder: Optional[FrozenFinder] = None
+
+
+def freeze(store: Optional[str] = None) -> None:
+    """
+    Compile saved fills into modules imported from now on.
+
+    `store` is a fill store to read from (see `todo.use_store`), otherwise the
+    current one is used. Modules that are already imported, including the
+    script you ran, are not affected.
+    """
+    global _finder
+    from todo import placeholder
+
+    if store is not None:
+        placeholder.use_store(store)
+    if _finder is None:
+        _finder = FrozenFinder(saved_fills)
+        sys.meta_path.insert(0, _finder)
+
+
+def unfreeze() -> None:
+    """
+    Stop freezing modules on import.
+    """
+    global _finder
+    if _finder is not None:
+        sys.meta_path.remove(_finder)
+        _finder = None
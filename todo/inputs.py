@@ -0,0 +1,111 @@
+"""
+Where placeholder sessions read their input from.
+
+An input source hands out one reader per session: `source.open(key)` returns a
+function that takes a prompt and returns a line, raising EOFError when the
+session is over (the same thing ctrl+D does at a terminal). Lines are recorded
+by the session exactly as if they had been typed.
+"""
+from typing import *
+
+
+ReadFnT = Callable[[str], str]
+
+
+class InputSource:
+    def open(self, key: Optional[str]) -> ReadFnT:
+        raise NotImplementedError('stub!')
+
+
+class TerminalInput(InputSource):
+    """
+    Someone typing at a terminal. This is the default.
+    """
+
+    def open(self, key: Optional[str]) -> ReadFnT:
+        return input
+
+
+class ScriptedInput(InputSource):
+    """
+    Canned answers per key.
+
+    `answers` maps a key to the lines to enter for it, or to a list of such
+    line lists if the key gets more than one session (e.g. '<anonymous>').
+    Lines for multiline sessions use the usual "!" prefix.
+    """
+
+    def __init__(self, answers: Mapping[str, Sequence[Any]] = None):
+        self.sessions: Dict[str, List[List[str]]] = {}
+        for key, lines in (answers or {}).items():
+            if lines and all(isinstance(line, list) for line in lines):
+                for session_lines in lines:
+                    self.add(key, session_lines)
+            else:
+                self.add(key, lines)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ScriptedInput':
+        """
+        Load answers from a JSON file shaped like the `answers` argument.
+        """
+        import json
+        with open(path, 'r') as in_f:
+            return cls(json.load(in_f))
+
+    def add(self, key: str, lines: Sequence[str]) -> None:
+        self.sessions.setdefault(key, []).append(list(lines))
+
+    def open(self, key: Optional[str]) -> ReadFnT:
+        queue = self.sessions.get(key)
+        if not queue:
+            raise LookupError(
+                'No scripted input for placeholder "{}"'.format(key)
+            )
+        lines = iter(queue.pop(0))
+
+        def readfunc(prompt: str) -> str:
+            try:
+                return next(lines)
+            except StopIteration:
+                raise EOFError
+        return readfunc
+
+
+class StreamInput(InputSource):
+    """
+    Lines read from a file or pipe, one session after another.
+
+    A line holding only `terminator` (ctrl+D, by default) ends a session, as
+    does the end of the stream.
+    """
+
+    def __init__(self, stream: IO[str], terminator: str = '\x04'):
+        self.stream = stream
+        self.terminator = terminator
+
+    def open(self, key: Optional[str]) -> ReadFnT:
+        def readfunc(prompt: str) -> str:
+            line = self.stream.readline()
+            if not line:
+                raise EOFError
+            line = line.rstrip('\n')
+            if line == self.terminator:
+                raise EOFError
+            return line
+        return readfunc
+
+
+class CallableInput(InputSource):
+    """
+    Lines from a function `fn(key, prompt) -> str`, which should raise
+    EOFError to end the session.
+    """
+
+    def __init__(self, fn: Callable[[Optional[str], str], str]):
+        self.fn = fn
+
+    def open(self, key: Optional[str]) -> ReadFnT:
+        def readfunc(prompt: str) -> str:
+            return self.fn(key, prompt)
+        return readfunc
@@ -0,0 +1,132 @@
+"""
+Hit counts and timings for placeholders, per (file, key, mode) and per phase.
+
+Phases:
+    access:   a whole placeholder access, start to finish
+    prompt:   waiting on the interactive session
+    evaluate: running the fill against the caller's frame
+    locate:   finding the accessor in the caller's source
+    rewrite:  editing the source file (or queueing the edit)
+"""
+import contextlib
+import sys
+import threading
+import time
+from typing import *
+
+
+SiteT = Tuple[str, str, str]
+
+_unknown_site = ('<unknown>', '<unknown>', '<unknown>')
+
+
+class PhaseStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class Instrumentation:
+    def __init__(self):
+        self.stats: Dict[Tuple[SiteT, str], PhaseStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def site(self, filename: str, key: Optional[str], mode: str):
+        """
+        Attribute everything recorded inside the block to this placeholder, and
+        time the block as one access.
+        """
+        prev = getattr(self._local, 'site', None)
+        site = (filename, key or '<anonymous>', mode)
+        self._local.site = site
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record('access', time.perf_counter() - start, site)
+            self._local.site = prev
+
+    @contextlib.contextmanager
+    def phase(self, phase: str, fallback_site: Optional[SiteT] = None):
+        """
+        Time the block as `phase` of the placeholder currently being accessed
+        on this thread, or of `fallback_site` if there isn't one (e.g. in an
+        executor thread).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            site = getattr(self._local, 'site', None) or fallback_site
+            self.record(phase, time.perf_counter() - start, site)
+
+    def record(
+            self,
+            phase: str,
+            elapsed: float,
+            site: Optional[SiteT] = None,
+    ) -> None:
+        if site is None:
+            site = getattr(self._local, 'site', None) or _unknown_site
+        with self._lock:
+            stats = self.stats.get((site, phase))
+            if stats is None:
+                stats = self.stats[(site, phase)] = PhaseStats()
+            stats.add(elapsed)
+
+    def query(
+            self,
+            filename: Optional[str] = None,
+            key: Optional[str] = None,
+            mode: Optional[str] = None,
+            phase: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Recorded stats matching every filter that isn't None, one dict per
+        (file, key, mode, phase), busiest first.
+        """
+        with self._lock:
+            items = list(self.stats.items())
+        rows = []
+        for (site, site_phase), stats in items:
+            row = {
+                'file': site[0],
+                'key': site[1],
+                'mode': site[2],
+                'phase': site_phase,
+                'count': stats.count,
+                'total': stats.total,
+                'max': stats.max,
+            }
+            filters = [
+                ('file', filename), ('key', key),
+                ('mode', mode), ('phase', phase),
+            ]
+            if all(want is None or row[k] == want for k, want in filters):
+                rows.append(row)
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def report(self, out: IO[str] = None) -> None:
+        out = out or sys.stderr
+        rows = self.query()
+        if not rows:
+            return
+        out.write('placeholder stats:\n')
+        out.write('{:<50} {:<10} {:>8} {:>12} {:>12}\n'.format(
+            'site', 'phase', 'count', 'total (s)', 'max (s)'
+        ))
+        for row in rows:
+            site = '{}:{} ({})'.format(row['file'], row['key'], row['mode'])
+            out.write('{:<50} {:<10} {:>8} {:>12.6f} {:>12.6f}\n'.format(
+                site, row['phase'], row['count'], row['total'], row['max']
+            ))
@@ -1,21 +1,33 @@
 #! /usr/bin/env python
 
 # This is how you know it's gonna be good
-import ast
-import code
-import inspect
+#
+# Anything heavy (ast, code, readline, asyncio, ctypes, the broker and store
+# machinery) is imported where it's first needed, so that `import todo` stays
+# cheap in processes that never open a session.
+import atexit
+import contextlib
+import itertools
+import os
 import sys
-
-try:
-    import readline  # makes arrow keys work
-except ImportError:
-    pass
-
-import textwrap
+import threading
+import time
+import weakref
+from collections import abc
+from types import CodeType
 from typing import *
 
+from todo.inputs import (
+    InputSource,
+    TerminalInput,
+    ScriptedInput,
+    StreamInput,
+    CallableInput,
+)
+from todo.instrument import Instrumentation
 
-FrameVarsT = Dict[str, Any]
+
+FrameVarsT = MutableMapping[str, Any]
 FrameT = Any
 ExpressionFill = str
 StatementFill = str
@@ -27,6 +39,22 @@ CodeFillT = Union[ExpressionFill, StatementFill, StatementsFill]
 
 __all__ = [
     'set_placeholder',
+    'aset_placeholder',
+    'map_placeholder',
+    'flush',
+    'defer_rewrites',
+    'use_store',
+    'use_snapshots',
+    'set_input',
+    'instrument',
+    'stats',
+    'cache_fills',
+    'FillBroker',
+    'freeze',
+    'unfreeze',
+    'prefill',
+    'ScriptedInput',
+    'StreamInput',
     'Placeholder',
     'ExpressionPlaceholder',
     'StatementPlaceholder',
@@ -35,7 +63,85 @@ __all__ = [
 
 
 default_session: Dict[Tuple[str, str], 'PlaceholderSession'] = {}
+# sessions of placeholder objects, held weakly: each one goes with its object
+default_object_sessions: 'weakref.WeakSet[PlaceholderSession]' = \
+    weakref.WeakSet()
+# (file, mode, owner) -> stand-in for a placeholder object this process
+# doesn't have, see `_owner_session`
+default_owner_sessions: Dict[Tuple[str, str, str], 'PlaceholderSession'] = {}
 default_rewrite_ctx: Dict[str, 'RewriteContext'] = {}
+default_store: Optional['FillStore'] = None
+# see `use_snapshots`
+default_snapshot_dir: Optional[str] = None
+default_input: InputSource = TerminalInput()
+# (absolute file, mode, key, owner) -> fill, from `todo.prefill()`
+default_prefill: Dict[Tuple[str, str, str, Optional[str]], 'CodeFillT'] = {}
+default_instrumentation: Optional[Instrumentation] = None
+
+_not_timed = contextlib.nullcontext()
+
+
+def _timed(phase: str, fallback_site: Tuple[str, str, str] = None) -> ContextManager:
+    if default_instrumentation is None:
+        return _not_timed
+    return default_instrumentation.phase(phase, fallback_site)
+
+
+def _timed_site(filename: str, key: Optional[str], mode: str) -> ContextManager:
+    if default_instrumentation is None:
+        return _not_timed
+    return default_instrumentation.site(filename, key, mode)
+
+
+default_call_sites: Dict[Tuple[CodeType, int], 'CallSite'] = {}
+default_source_index: Dict[str, Tuple[Tuple[int, int], Optional['SourceIndex']]] = {}
+
+# see `cache_fills`
+default_fill_limit: Optional[int] = None
+default_remember_anonymous = False
+# whether a call site hit can skip straight to eval, with no bookkeeping
+_plain_hits = True
+
+# file -> ((mtime, size), generation). The generation goes up whenever the file
+# changes under us, and fills made under an older one are stale.
+default_source_versions: Dict[str, Tuple[Optional[Tuple[int, int]], int]] = {}
+
+
+def _file_stamp(filename: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def source_version(filename: str) -> int:
+    stamp = _file_stamp(filename)
+    entry = default_source_versions.get(filename)
+    if entry is None:
+        entry = default_source_versions.setdefault(filename, (stamp, 0))
+    elif entry[0] != stamp:
+        entry = default_source_versions[filename] = (stamp, entry[1] + 1)
+    return entry[1]
+
+
+def note_own_write(filename: str) -> None:
+    """
+    Take the file's new stamp as current, so that our own rewrites don't make
+    its fills stale, here or in the store.
+    """
+    entry = default_source_versions.get(filename)
+    if entry is not None:
+        if default_store is not None:
+            default_store.note_rewrite(filename, entry[0])
+        default_source_versions[filename] = (_file_stamp(filename), entry[1])
+
+
+def _before_own_write(filename: str) -> None:
+    # the store needs the hash of the file as it was, to tell our rewrite
+    # apart from someone else's edit in `note_own_write`
+    if default_store is not None:
+        default_store.source_hash(filename)
 
 
 def _find_all(s: str, sub: str, start: int = 0):
@@ -50,112 +156,575 @@ def _find_all(s: str, sub: str, start: int = 0):
         idx += 1
 
 
+_locals_to_fast = None
+
+
+def _load_locals_to_fast() -> Optional[Callable[[FrameT], None]]:
+    global _locals_to_fast
+    if _locals_to_fast is None:
+        try:
+            import ctypes
+            api = ctypes.pythonapi.PyFrame_LocalsToFast
+            _locals_to_fast = lambda frame: api(
+                ctypes.py_object(frame), ctypes.c_int(0)
+            )
+        except (ImportError, AttributeError):
+            # no ctypes, or a python where f_locals writes go straight to the
+            # frame
+            _locals_to_fast = False
+    return _locals_to_fast or None
+
+
 def inject_vars(frame: FrameT, updates: FrameVarsT) -> None:
+    if not updates:
+        return
+    f_locals = frame.f_locals
     for k, v in updates.items():
-        frame.f_locals[k] = v
+        f_locals[k] = v
+    if f_locals is not frame.f_globals:
+        # Function locals live in fast slots; f_locals is only a snapshot of
+        # them, so copy the snapshot back or the writes are lost
+        locals_to_fast = _load_locals_to_fast()
+        if locals_to_fast is not None:
+            locals_to_fast(frame)
 
 
-def get_frame_vars(frame):
-    return {**frame.f_globals, **frame.f_locals}
+def get_frame_vars(frame: FrameT) -> 'FrameNamespace':
+    return FrameNamespace(frame)
 
 
-class ValidInterpreter(code.InteractiveConsole):
-    def showtraceback(self):
-        raise
+class FrameNamespace(abc.MutableMapping):
+    """
+    A lazy view of a frame's variables: locals first, then globals.
+
+    Nothing is copied up front. Assignments made through the view are kept in
+    `updates` so they can be written back to the frame with `inject_vars`.
+    """
+
+    def __init__(self, frame: FrameT):
+        self.f_globals = frame.f_globals
+        self.f_locals = frame.f_locals
+        self.updates: Dict[str, Any] = {}
+        # (fill, value, updates) left by an interactive session run against
+        # this view, see `PlaceholderSession.session_result`
+        self.session_result: Optional[Tuple[Any, ValueT, Dict[str, Any]]] = None
+
+    @property
+    def is_module(self) -> bool:
+        return self.f_locals is self.f_globals
+
+    def __getitem__(self, k: str) -> Any:
+        if k in self.updates:
+            return self.updates[k]
+        if k in self.f_locals:
+            return self.f_locals[k]
+        return self.f_globals[k]
+
+    def __setitem__(self, k: str, v: Any) -> None:
+        self.updates[k] = v
+
+    def __delitem__(self, k: str) -> None:
+        if k in self.updates:
+            del self.updates[k]
+        else:
+            del self.f_locals[k]
+
+    def __contains__(self, k: object) -> bool:
+        return k in self.updates or k in self.f_locals or k in self.f_globals
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.updates
+        for k in self.f_locals:
+            if k not in self.updates:
+                yield k
+        if self.is_module:
+            return
+        for k in self.f_globals:
+            if k not in self.updates and k not in self.f_locals:
+                yield k
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def run(self, compiled: CodeType, run_fn: Callable = eval) -> Any:
+        """
+        Run compiled code against the frame, collecting writes in `updates`.
+        """
+        if self.is_module:
+            # module scope: the globals *are* the namespace, so let the code
+            # write to them directly
+            return run_fn(compiled, self.f_globals)
+        if not any(isinstance(c, CodeType) for c in compiled.co_consts):
+            return run_fn(compiled, self.f_globals, self)
+        # Nested scopes (lambdas, comprehensions) can only see globals, so
+        # function locals have to be flattened into a real dict for them.
+        flat = dict(self)
+        value = run_fn(compiled, flat)
+        for k, v in flat.items():
+            if k not in self or self[k] is not v:
+                self.updates[k] = v
+        return value
+
+
+def run_code(
+        compiled: CodeType,
+        frame_vars: FrameVarsT,
+        run_fn: Callable = eval,
+) -> Tuple[ValueT, FrameVarsT]:
+    if isinstance(frame_vars, FrameNamespace):
+        value = frame_vars.run(compiled, run_fn)
+        return value, frame_vars.updates
+    value = run_fn(compiled, frame_vars)
+    return value, frame_vars
+
+
+# Only one interactive session at a time, whichever thread or session it's for.
+# Reentrant, since a fill being worked out can hit another placeholder.
+_interact_lock = threading.RLock()
+_terminal_ready = False
+
+
+def _setup_terminal() -> None:
+    # only once someone is actually going to type at it
+    global _terminal_ready
+    if _terminal_ready:
+        return
+    _terminal_ready = True
+    try:
+        import readline  # makes arrow keys work
+    except ImportError:
+        pass
+
+
+def _dedent(text: str) -> str:
+    import textwrap
+    return textwrap.dedent(text)
+
+
+def broker_client() -> Optional['BrokerClient']:
+    # the broker module (and its sockets) only gets imported in processes
+    # that actually have a broker
+    if not os.environ.get('TODO_PLACEHOLDER_BROKER'):
+        return None
+    from todo.broker import broker_client
+    return broker_client()
+
+
+_lazy_exports = {
+    'FillBroker': 'todo.broker',
+    'freeze': 'todo.frozen',
+    'unfreeze': 'todo.frozen',
+    'prefill': 'todo.batch',
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy_exports:
+        import importlib
+        return getattr(importlib.import_module(_lazy_exports[name]), name)
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name)
+    )
+
+
+class InFlightFill:
+    """
+    A fill some thread is currently prompting for. Other threads that want the
+    same key wait on it instead of opening their own session.
+
+    `leader` is the thread that's prompting. It can't wait on itself: if
+    trying a fill out in its session hits the same key again (a recursive
+    fill), that hit gets a nested session.
+    """
+
+    def __init__(self):
+        self.leader = threading.get_ident()
+        self.done = threading.Event()
+        self.fill: Optional[CodeFillT] = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self, name: str) -> CodeFillT:
+        self.done.wait()
+        if self.error is not None:
+            raise RuntimeError(
+                'Filling placeholder "{}" failed in another thread'.format(name)
+            ) from self.error
+        return self.fill
 
 
 class PlaceholderSession:
+    mode: str
     _placeholder_msg: str
+    _compile_mode: str
 
-    def __init__(self):
+    def __init__(
+            self,
+            filename: Optional[str] = None,
+            owner: Optional[str] = None,
+    ):
+        # the file (and `mode`) this session's fills are kept under on disk
+        self.filename = filename
+        # what tells this session's fills apart from others with the same
+        # file, mode and key, outside this process: None for the session
+        # `set_placeholder` calls share, see `_object_owner` for a placeholder
+        # object's
+        self.owner = owner
+        # least recently used first, see `cache_fills`
         self.fills: Dict[str, CodeFillT] = {}
+        # name -> generation of `filename` the fill was made under
+        self.versions: Dict[str, int] = {}
+        # name -> `default_call_sites` keys registered for it
+        self.call_sites: Dict[str, List[Tuple[CodeType, int]]] = {}
+        # (fill source, compile mode) -> code object, so a filled key is only
+        # parsed once no matter how many times it gets hit
+        self.compiled: Dict[Tuple[str, str], CodeType] = {}
+        # name -> (item name, caller variables) -> code, see `map_placeholder`
+        self.batch_compiled: Dict[str, Dict[Tuple[str, Tuple[str, ...]], CodeType]] = {}
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, InFlightFill] = {}
+        self._async_fills: Dict[str, 'asyncio.Future'] = {}
 
     def get_fill(
             self,
             key: 'PlaceholderAccessor',
             frame_vars: FrameVarsT,
     ) -> CodeFillT:
-        if key.via == 'anonymous':
-            return self.interact('<anonymous>', frame_vars)
-        if key.name not in self.fills:
-            self.fills[key.name] = self.interact(key.name, frame_vars)
-        return self.fills[key.name]
+        if key.name is None:
+            return self.request_fill(None, frame_vars)
+
+        # no locking once a key is filled
+        fill = self.current_fill(key.name)
+        if fill is not None:
+            return fill
+
+        with self._lock:
+            fill = self.current_fill(key.name)
+            if fill is not None:
+                return fill
+            in_flight = self._in_flight.get(key.name)
+            if in_flight is not None:
+                leader = False
+            else:
+                leader = True
+                in_flight = self._in_flight[key.name] = InFlightFill()
+
+        if not leader and in_flight.leader != threading.get_ident():
+            return in_flight.wait(key.name)
+        if not leader:
+            # nested in this thread's own session for the key
+            fill = self.find_fill(key, frame_vars)
+            with self._lock:
+                self.set_fill(key.name, fill)
+            return fill
 
-    def interact(self, key: Optional[str], frame_vars: FrameVarsT) -> CodeFillT:
-        lines = self.run_interpreter(
-            banner=self._placeholder_msg.format(key=key),
-            local=frame_vars
+        try:
+            fill = self.find_fill(key, frame_vars)
+            with self._lock:
+                self.set_fill(key.name, fill)
+            in_flight.fill = fill
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key.name]
+            in_flight.done.set()
+        return fill
+
+    def find_fill(
+            self,
+            key: 'PlaceholderAccessor',
+            frame_vars: FrameVarsT,
+    ) -> CodeFillT:
+        """
+        A fill for a named key that isn't filled here yet: from the store, the
+        prefilled answers, or else by asking for one (and storing it).
+        """
+        # anonymous fills remembered per call site never go to the store,
+        # their names only mean something to this process
+        anonymous = key.via == 'anonymous'
+        fill = None if anonymous else self.stored_fill(key.name)
+        if fill is None and not anonymous:
+            fill = self.prefilled_fill(key.name)
+        if fill is None:
+            fill = self.request_fill(None if anonymous else key.name, frame_vars)
+            if not anonymous:
+                self.store_fill(key.name, fill)
+        return fill
+
+    async def aget_fill(
+            self,
+            key: 'PlaceholderAccessor',
+            frame_vars: FrameVarsT,
+    ) -> CodeFillT:
+        """
+        `get_fill` that prompts in an executor instead of blocking the loop.
+        Tasks waiting on the same key share one prompt.
+        """
+        if key.name is not None:
+            fill = self.current_fill(key.name)
+            if fill is not None:
+                return fill
+
+        import asyncio
+        loop = asyncio.get_running_loop()
+        # snapshot now, the executor thread shouldn't be poking at a live frame
+        snapshot = dict(frame_vars)
+        if key.name is None:
+            return await loop.run_in_executor(
+                None, self.get_fill, key, snapshot
+            )
+
+        pending = self._async_fills.get(key.name)
+        if pending is None or pending.get_loop() is not loop:
+            pending = loop.run_in_executor(None, self.get_fill, key, snapshot)
+            self._async_fills[key.name] = pending
+
+            def forget(done, name=key.name):
+                if self._async_fills.get(name) is done:
+                    del self._async_fills[name]
+            pending.add_done_callback(forget)
+        # shielded, so one waiter being cancelled doesn't cancel the others
+        return await asyncio.shield(pending)
+
+    def stored_fill(self, name: str) -> Optional[CodeFillT]:
+        if default_store is None or self.filename is None:
+            return None
+        return default_store.get(self.filename, self.mode, name, self.owner)
+
+    def store_fill(self, name: str, fill: CodeFillT) -> None:
+        if default_store is None or self.filename is None:
+            return
+        if broker_client() is not None:
+            return  # the broker keeps it
+        default_store.put(self.filename, self.mode, name, fill, self.owner)
+
+    def prefilled_fill(self, name: str) -> Optional[CodeFillT]:
+        if not default_prefill or self.filename is None:
+            return None
+        return default_prefill.get(
+            (os.path.abspath(self.filename), self.mode, name, self.owner)
         )
-        return self.parse_session(lines)
+
+    def current_fill(self, name: str) -> Optional[CodeFillT]:
+        """
+        The fill for `name`, unless there isn't one or its source file has
+        changed since it was made.
+        """
+        fill = self.fills.get(name)
+        if fill is None:
+            return None
+        if (
+                self.filename is not None
+                and self.versions.get(name) != source_version(self.filename)
+        ):
+            return None
+        if default_fill_limit is not None:
+            self.touch(name)
+        return fill
+
+    def touch(self, name: str) -> None:
+        # `fills` is a plain dict, not an OrderedDict, to keep hits fast
+        try:
+            self.fills[name] = self.fills.pop(name)
+        except KeyError:
+            pass  # evicted by another thread
+
+    def set_fill(self, name: str, fill: CodeFillT) -> None:
+        if name in self.fills:
+            self.forget(name)
+        self.fills[name] = fill
+        if self.filename is not None:
+            self.versions[name] = source_version(self.filename)
+        if default_fill_limit is not None:
+            while len(self.fills) > default_fill_limit:
+                self.forget(next(iter(self.fills)))
+
+    def forget(self, name: str) -> None:
+        """
+        Drop the fill for `name`, along with everything cached for it.
+        """
+        fill = self.fills.pop(name, None)
+        self.versions.pop(name, None)
+        if fill is not None:
+            self.compiled.pop(
+                (self.fill_source(fill), self._compile_mode), None
+            )
+        self.batch_compiled.pop(name, None)
+        _call_accessors.pop(name, None)
+        for site_key in self.call_sites.pop(name, ()):
+            site = default_call_sites.get(site_key)
+            if site is not None and site.session is self and site.name == name:
+                default_call_sites.pop(site_key, None)
+
+    def compile_fill(self, fill: CodeFillT) -> CodeType:
+        source = self.fill_source(fill)
+        cache_key = (source, self._compile_mode)
+        compiled = self.compiled.get(cache_key)
+        if compiled is None:
+            compiled = compile(source, '<placeholder>', self._compile_mode)
+            self.compiled[cache_key] = compiled
+        return compiled
+
+    @staticmethod
+    def fill_source(fill: CodeFillT) -> str:
+        return fill
+
+    def request_fill(
+            self,
+            name: Optional[str],
+            frame_vars: FrameVarsT,
+    ) -> CodeFillT:
+        """
+        Ask for a fill: from the broker if this is a worker process under a
+        `FillBroker`, otherwise from an interactive session here.
+        """
+        client = broker_client()
+        if client is not None:
+            return client.request_fill(
+                self.filename, self.mode, name, frame_vars, self.owner
+            )
+        if default_snapshot_dir is not None:
+            from todo.snapshot import fail_unfilled
+            fail_unfilled(
+                default_snapshot_dir, self.filename, self.mode, name,
+                frame_vars, default_store.path if default_store else None,
+                self.owner,
+            )
+        with _interact_lock:
+            return self.interact(name or '<anonymous>', frame_vars)
+
+    def interact(self, key: Optional[str], frame_vars: FrameVarsT) -> CodeFillT:
+        site = (self.filename or '<unknown>', key or '<anonymous>', self.mode)
+        with _timed('prompt', site):
+            lines, console = self.run_interpreter(
+                banner=_dedent(self._placeholder_msg).format(key=key),
+                local=dict(frame_vars),
+                read_raw=default_input.open(key),
+            )
+        fill = self.parse_session(lines)
+        if isinstance(frame_vars, FrameNamespace):
+            # the session already did the work, the first hit can use it
+            result = self.session_result(console)
+            if result is not None:
+                frame_vars.session_result = (fill,) + result
+        return fill
 
     @classmethod
-    def run_interpreter(cls, banner: str, local: FrameVarsT) -> List[str]:
-        read_fn, read_lines = cls.mkread()
-        code.interact(
-            banner=banner,
-            readfunc=read_fn,
-            local=local,
-        )
-        return read_lines
+    def run_interpreter(
+            cls,
+            banner: str,
+            local: FrameVarsT,
+            read_raw: Callable[[str], str] = input,
+    ) -> Tuple[List[str], 'RecordingConsole']:
+        from todo.console import interact
+        if read_raw is input:
+            _setup_terminal()
+        read_fn, read_lines = cls.mkread(read_raw)
+        console = interact(banner, local, read_fn, read_lines)
+        return read_lines, console
+
+    def session_result(
+            self,
+            console: 'RecordingConsole',
+    ) -> Optional[Tuple[ValueT, FrameVarsT]]:
+        """
+        (value, updates) the fill left in the session, if it's the same as
+        running the fill against the frame would give.
+        """
+        return None
 
     @staticmethod
-    def mkread() -> Tuple[Callable[[str], str], List[str]]:
+    def mkread(
+            read_raw: Callable[[str], str] = input,
+    ) -> Tuple[Callable[[str], str], List[str]]:
         raise NotImplementedError('stub!')
 
-    @staticmethod
     def evaluate_fill(
+        self,
         expression: CodeFillT,
         frame_vars: FrameVarsT
     ) -> Tuple[ValueT, FrameVarsT]:
         raise NotImplementedError('stub!')
 
+    def run_fill(
+        self,
+        compiled: CodeType,
+        frame_vars: FrameVarsT
+    ) -> Tuple[ValueT, FrameVarsT]:
+        raise NotImplementedError('stub!')
+
     def parse_session(self, lines: List[str]) -> CodeFillT:
         raise NotImplementedError('stub!')
 
 
 class SinglePlaceholderSession(PlaceholderSession):
     @staticmethod
-    def mkread() -> Tuple[Callable[[str], str], List[str]]:
+    def mkread(
+            read_raw: Callable[[str], str] = input,
+    ) -> Tuple[Callable[[str], str], List[str]]:
         lines = []
         def readfunc(prompt: str) -> str:
-            line = input(prompt)
+            line = read_raw(prompt)
             lines.append(line)
             return line
         return readfunc, lines
 
-    @staticmethod
     def evaluate_fill(
+        self,
         expression: CodeFillSingleT,
         frame_vars: FrameVarsT
     ) -> Tuple[ValueT, FrameVarsT]:
-        raise NotImplementedError('stub!')
+        return self.run_fill(self.compile_fill(expression), frame_vars)
+
+    def session_result(self, console):
+        # the fill is the last line, so that has to be the last thing run, and
+        # nothing before it can have changed what it sees
+        if not console.units or not console.ran_everything():
+            return None
+        *earlier, last = console.units
+        if any(unit.changes or unit.deleted for unit in earlier):
+            return None
+        if last.count != 1 or not last.ok or last.deleted:
+            return None
+        return self.unit_value(last), last.changes
+
+    @staticmethod
+    def unit_value(unit: 'Unit') -> ValueT:
+        return None
 
     def parse_session(self, lines: List[str]) -> CodeFillSingleT:
         raise NotImplementedError('stub!')
 
 
 class ExpressionPlaceholderSession(SinglePlaceholderSession):
-    _placeholder_msg = textwrap.dedent('''
+    mode = 'expression'
+    _placeholder_msg = '''
         Entering ExpressionPlaceholder session.
         When you have an expression that works, press ctrl+D to end the session 
         and replace the placeholder with the last line you typed.
         Alternatively, call exit() to abort.
         
         # TODO: fill variable "{key}"
-    ''')
+    '''
+    _compile_mode = 'eval'
 
     @staticmethod
-    def evaluate_fill(
-        expression: CodeFillSingleT,
+    def unit_value(unit):
+        return unit.value if unit.displayed else None
+
+    def run_fill(
+        self,
+        compiled: CodeType,
         frame_vars: FrameVarsT
     ) -> Tuple[ValueT, FrameVarsT]:
-        value = eval(expression, frame_vars)
-        return value, frame_vars
+        return run_code(compiled, frame_vars)
 
     def parse_session(self, lines):
         if not lines:
             raise ValueError('No lines entered; placeholder fill aborted')
         expr = lines[-1]
+        import ast
         if ast.parse(expr).body[0].__class__.__name__ != 'Expr':
             raise ValueError(
                 'Your statement was not an expression, it won\'t work for '
@@ -165,26 +734,28 @@ class ExpressionPlaceholderSession(SinglePlaceholderSession):
 
 
 class StatementPlaceholderSession(SinglePlaceholderSession):
-    _placeholder_msg = textwrap.dedent('''
+    mode = 'statement'
+    _placeholder_msg = '''
         Entering StatementPlaceholder session.
         When you have an expression that works, press ctrl+D to end the session 
         and replace the placeholder with the last line you typed.
         Alternatively, call exit() to abort.
         
         # TODO: fill statement "{key}"
-    ''')
+    '''
+    _compile_mode = 'exec'
 
-    @staticmethod
-    def evaluate_fill(
-        expression: CodeFillSingleT,
+    def run_fill(
+        self,
+        compiled: CodeType,
         frame_vars: FrameVarsT
     ) -> Tuple[ValueT, FrameVarsT]:
-        exec(expression, frame_vars)
+        _, updates = run_code(compiled, frame_vars, exec)
         try:
             value = _  # holy shit
         except NameError:
             value = None
-        return value, frame_vars
+        return value, updates
 
     def parse_session(self, lines: List[str]) -> CodeFillSingleT:
         if not lines:
@@ -193,7 +764,8 @@ class StatementPlaceholderSession(SinglePlaceholderSession):
 
 
 class MultilinePlaceholderSession(PlaceholderSession):
-    _placeholder_msg = textwrap.dedent('''
+    mode = 'multiline'
+    _placeholder_msg = '''
         Entering MultilinePlaceholder session.
         Play around in your session.
         When you want to add a statement to the placeholder, prefix it with "!"
@@ -205,45 +777,314 @@ class MultilinePlaceholderSession(PlaceholderSession):
         Alternatively, call exit() to abort.
         
         # TODO: fill statements at "{key}"
-    ''')
+    '''
+    _compile_mode = 'exec'
 
-    @staticmethod
-    def evaluate_fill(fill: StatementsFill, frame_vars: FrameVarsT):
-        # could probably be replaced by exec()
-        interpreter = ValidInterpreter(locals=frame_vars)
-        for line in fill:
-            interpreter.runsource(line)
-        updates = {}
-        for k, v in interpreter.locals.items():
-            updates[k] = v
-        return None, frame_vars
+    def evaluate_fill(
+        self,
+        fill: StatementsFill,
+        frame_vars: FrameVarsT
+    ) -> Tuple[ValueT, FrameVarsT]:
+        return self.run_fill(self.compile_fill(fill), frame_vars)
+
+    def run_fill(
+        self,
+        compiled: CodeType,
+        frame_vars: FrameVarsT
+    ) -> Tuple[ValueT, FrameVarsT]:
+        _, updates = run_code(compiled, frame_vars, exec)
+        return None, updates
 
     @staticmethod
-    def mkread():
+    def mkread(read_raw=input):
         lines = []
         def readfunc(prompt):
-            line = input(prompt)
+            line = read_raw(prompt)
             if line.startswith('!'):
                 line = line[1:]
                 lines.append(line)
             return line
         return readfunc, lines
 
+    def session_result(self, console):
+        # the "!" statements have to be everything that changed the namespace
+        if not console.ran_everything():
+            return None
+        updates = {}
+        for unit in console.units:
+            if unit.recorded is None:
+                return None
+            if unit.recorded:
+                if not unit.ok or unit.deleted:
+                    return None
+                updates.update(unit.changes)
+            elif unit.changes or unit.deleted:
+                return None
+        return None, updates
+
     def parse_session(self, lines: List[str]) -> StatementsFill:
         return lines
 
+    @staticmethod
+    def fill_source(fill: StatementsFill) -> str:
+        return '\n'.join(fill)
+
 
 class PlaceholderAccessor:
-    def __init__(self, name: Optional[str], via: str, parent: Any):
+    __slots__ = ('name', 'via', 'parent', 'awaited')
+
+    def __init__(
+            self,
+            name: Optional[str],
+            via: str,
+            parent: Any,
+            awaited: bool = False,
+    ):
         self.name = name
         self.via = via
         self.parent = parent
+        # accessed as `await parent(...)`, and rewritten including the await
+        self.awaited = awaited
+
+
+# name -> (parent, awaited) -> accessor, for the set_placeholder family.
+# Accessors are never changed once made, so every call can share one, and one
+# made again after `PlaceholderSession.forget` drops the name is just as good.
+# Placeholder objects keep their own, see `PlaceholderBase._accessor`.
+_call_accessors: Dict[
+    Optional[str], Dict[Tuple[Any, bool], PlaceholderAccessor]
+] = {}
+
+
+_DYNAMIC_KEY = object()
+
+SpanT = Tuple[int, int]
+
+
+def _char_col(line: str, byte_col: int) -> int:
+    if line.isascii():
+        return byte_col
+    return len(line.encode('utf-8')[:byte_col].decode('utf-8', 'replace'))
+
+
+def frame_position(frame: FrameT) -> Optional[Tuple[int, int, int]]:
+    """
+    (lineno, start byte column, end byte column) of the instruction the frame
+    is currently running, if the interpreter keeps that around.
+    """
+    co_positions = getattr(frame.f_code, 'co_positions', None)
+    if co_positions is None:
+        return None
+    position = next(
+        itertools.islice(co_positions(), frame.f_lasti // 2, None), None
+    )
+    if position is None or None in position:
+        return None
+    lineno, end_lineno, col, end_col = position
+    if lineno != end_lineno:
+        return None
+    return lineno, col, end_col
+
+
+def _resolves_to(expr: str, frame_vars: FrameVarsT, obj: Any) -> bool:
+    names = expr.split('.')
+    if not all(name.isidentifier() for name in names):
+        return False
+    if names[0] not in frame_vars:
+        return False
+    value = frame_vars[names[0]]
+    for name in names[1:]:
+        value = getattr(value, name, None)
+    return value is obj
+
+
+class SourceSite:
+    """
+    A call or attribute access in source that could be a placeholder accessor.
+    Columns are character offsets into the line.
+    """
+
+    def __init__(
+            self,
+            kind: str,
+            lineno: int,
+            col: int,
+            end_col: int,
+            key: Any,
+            target: str,
+    ):
+        self.kind = kind  # 'call', 'await' (an awaited call) or 'attr'
+        self.lineno = lineno
+        self.col = col
+        self.end_col = end_col
+        # attr: the attribute name. call: the constant first argument, None for
+        # an anonymous call, or _DYNAMIC_KEY if it isn't a constant
+        self.key = key
+        # source of the called function / the object the attribute is read from
+        self.target = target
+
+    @property
+    def span(self) -> SpanT:
+        return self.col, self.end_col
+
+    def matches(self, key: 'PlaceholderAccessor') -> bool:
+        if key.via == 'attr':
+            return self.kind == 'attr' and self.key == key.name
+        if self.kind != ('await' if key.awaited else 'call'):
+            return False
+        if self.key is _DYNAMIC_KEY:
+            return False
+        if key.via == 'anonymous':
+            return self.key is None
+        return self.key == key.name
+
+
+class SourceIndex:
+    """
+    Every single-line call and attribute access in a source file, found by
+    parsing it once.
+    """
+
+    def __init__(self, source: str):
+        lines = source.split('\n')
+        self.by_span: Dict[Tuple[int, int, int], SourceSite] = {}
+        self.by_line: Dict[int, List[SourceSite]] = {}
+
+        import ast
+        for node in ast.walk(ast.parse(source)):
+            if isinstance(node, ast.Call):
+                kind = 'call'
+                key = self._call_key(node)
+                target_node = node.func
+            elif isinstance(node, ast.Await) and isinstance(node.value, ast.Call):
+                kind = 'await'
+                key = self._call_key(node.value)
+                target_node = node.value.func
+            elif isinstance(node, ast.Attribute):
+                if not isinstance(node.ctx, ast.Load):
+                    continue
+                kind = 'attr'
+                key = node.attr
+                target_node = node.value
+            else:
+                continue
+            if node.lineno != node.end_lineno:
+                continue
+            if target_node.lineno != node.lineno:
+                continue
+
+            line = lines[node.lineno - 1]
+            site = SourceSite(
+                kind=kind,
+                lineno=node.lineno,
+                col=_char_col(line, node.col_offset),
+                end_col=_char_col(line, node.end_col_offset),
+                key=key,
+                target=line[
+                    _char_col(line, target_node.col_offset):
+                    _char_col(line, target_node.end_col_offset)
+                ],
+            )
+            self.by_span[
+                (node.lineno, node.col_offset, node.end_col_offset)
+            ] = site
+            self.by_line.setdefault(node.lineno, []).append(site)
+
+        for sites in self.by_line.values():
+            sites.sort(key=lambda site: site.col)
+
+    @staticmethod
+    def _call_key(node: 'ast.Call') -> Any:
+        import ast
+        if node.args:
+            arg = node.args[0]
+        else:
+            arg = next((k.value for k in node.keywords if k.arg == 'key'), None)
+        if arg is None:
+            return None
+        if not isinstance(arg, ast.Constant):
+            return _DYNAMIC_KEY
+        return arg.value
+
+    @classmethod
+    def for_file(cls, fname: str) -> Optional['SourceIndex']:
+        """
+        Index for `fname`, reparsed only when the file's mtime or size changes.
+        None if the file can't be parsed.
+        """
+        try:
+            st = os.stat(fname)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = default_source_index.get(fname)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            with open(fname, 'r') as in_f:
+                index = cls(in_f.read())
+        except (SyntaxError, ValueError, UnicodeDecodeError):
+            index = None
+        default_source_index[fname] = (stamp, index)
+        return index
+
+    def find(
+            self,
+            lineno: int,
+            key: 'PlaceholderAccessor',
+            frame_vars: FrameVarsT,
+            position: Optional[Tuple[int, int]] = None,
+    ) -> Optional[SourceSite]:
+        """
+        Find the accessor for `key` on a line. `position` is the byte span of
+        the running instruction; when it lines up with a site, that's an exact
+        hit and nothing else has to be checked.
+        """
+        if position is not None:
+            site = self.by_span.get((lineno,) + position)
+            if site is not None and site.matches(key):
+                return site
+            if site is not None and site.key is _DYNAMIC_KEY:
+                raise ValueError(
+                    'Placeholder is unable to deeply inspect expressions to '
+                    'discriminate between accessors. Please call '
+                    '`set_placeholder` only with a constant expression for '
+                    'the first argument'
+                )
+        candidates = [
+            site for site in self.by_line.get(lineno, ())
+            if site.matches(key)
+        ]
+        if len(candidates) > 1:
+            candidates = [
+                site for site in candidates
+                if _resolves_to(site.target, frame_vars, key.parent)
+            ] or candidates
+        if candidates:
+            return candidates[0]
+        return None
 
 
 class RewriteContext:
+    deferred = False
+
     def __init__(self, filename: str):
+        from todo.splice import EditLog
+
         self.filename = filename
-        self.offset = 0
+        # maps lines and columns as the running code knows them to where
+        # they've got to in the file; reset when the file changes under us
+        self.edits = EditLog()
+        self.edits_version = source_version(filename)
+        # (line index, span) -> (fill, is multiline, generation of the file it
+        # was located in), see `defer_rewrites`
+        self.pending: Dict[Tuple[int, SpanT], Tuple[CodeFillT, bool, int]] = {}
+        self._source: Optional['SourceFile'] = None
+        # one edit to the file at a time
+        self.lock = threading.RLock()
+        # (code, instruction offset) of every access already rewritten, so a
+        # site hit by several threads at once is only edited once
+        self.rewritten_sites: Set[Tuple[CodeType, int]] = set()
 
     def rewrite_allowed(
         self,
@@ -289,6 +1130,7 @@ class RewriteContext:
 
     @staticmethod
     def _test_call(key: PlaceholderAccessor, call: str) -> bool:
+        import ast
         try:
             expr = ast.parse(call, mode='eval')
         except SyntaxError:
@@ -353,24 +1195,184 @@ class RewriteContext:
         else:
             raise NotImplementedError('Unsupported key via {}'.format(key.via))
 
-    def rewrite_single(
+    def queued(self) -> bool:
+        """
+        Whether edits are held back (deferred here, or sent to a broker)
+        rather than written to the file right away.
+        """
+        return self.deferred or broker_client() is not None
+
+    def _queue(
+            self,
+            caller_lineno: int,
+            span: SpanT,
+            fill: CodeFillT,
+            multi: bool,
+    ) -> None:
+        client = broker_client()
+        if client is not None:
+            client.request_rewrite(
+                self.filename, caller_lineno, span, fill, multi
+            )
+        else:
+            self.add_pending(caller_lineno, span, fill, multi)
+
+    def add_pending(
             self,
+            lineno: int,
+            span: SpanT,
+            fill: CodeFillT,
+            multi: bool,
+    ) -> None:
+        # the line and span only mean something in the file as it is now
+        self.pending[(lineno, span)] = (
+            fill, multi, source_version(self.filename)
+        )
+
+    @contextlib.contextmanager
+    def caller_source(self, fname: str) -> Iterator['SourceFile']:
+        from todo.splice import SourceFile
+
+        if not self.queued():
+            with SourceFile(fname) as source:
+                yield source
+            return
+        # Deferred edits are applied against the file as it was last flushed,
+        # so one mapping is good until the next flush
+        if self._source is None:
+            self._source = SourceFile(fname)
+        yield self._source
+
+    def _release_source(self) -> None:
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    def locate(
+            self,
+            fname: str,
+            caller_lineno: int,
+            caller_line: str,
             key: PlaceholderAccessor,
-            fill: CodeFillSingleT,
             frame: FrameT,
             frame_vars: FrameVarsT,
+    ) -> SpanT:
+        """
+        Character span of the accessor for `key` on the caller's line.
+        """
+        with _timed('locate'):
+            index = SourceIndex.for_file(fname)
+            if index is not None:
+                position = frame_position(frame)
+                if position is not None and position[0] == frame.f_lineno:
+                    # columns as compiled, moved past edits earlier on the line
+                    position = tuple(
+                        self.edits.col(frame.f_lineno - 1, col)
+                        for col in position[1:]
+                    )
+                    if None in position:
+                        position = None
+                else:
+                    position = None
+                site = index.find(caller_lineno + 1, key, frame_vars, position)
+                if site is not None:
+                    return site.span
+
+            accessor = self._find_accesspoint(caller_line, key, frame_vars)
+            col = caller_line.find(accessor)
+            end_col = col + len(accessor)
+            if key.awaited and caller_line[:col].rstrip().endswith('await'):
+                col = caller_line.rfind('await', 0, col)
+            return col, end_col
+
+    @staticmethod
+    def _splice_single(
+            caller_line: str,
+            span: SpanT,
+            fill: CodeFillSingleT,
+    ) -> str:
+        col, end_col = span
+        return caller_line[:col] + fill + caller_line[end_col:]
+
+    @staticmethod
+    def _splice_multi(
+            caller_line: str,
+            span: SpanT,
+            fill: StatementsFill,
+    ) -> List[str]:
+        col, end_col = span
+        if (caller_line[:col] + caller_line[end_col:]).strip():
+            raise ValueError(
+                'A multi-line placeholder must be the only statement on the '
+                'line it is called from. '
+            )
+        indent = caller_line[:col]
+        newline = '\r\n' if caller_line.endswith('\r\n') else '\n'
+        return [indent + line + newline for line in fill]
+
+    def _sync_edits(self) -> None:
+        from todo.splice import EditLog
+
+        version = source_version(self.filename)
+        if version != self.edits_version:
+            self.edits = EditLog()
+            self.edits_version = version
+            # a mapping of the old file would give lines that aren't there
+            self._release_source()
+        _before_own_write(self.filename)
+
+    def _record_span(
+            self,
+            lineno: int,
+            caller_line: str,
+            span: SpanT,
+            fill: CodeFillSingleT,
     ) -> None:
-        fname = frame.f_globals['__file__']
-        with open(fname, 'r') as in_f:
-            caller_source = in_f.readlines()
-        caller_lineno = frame.f_lineno - 1 + self.offset
-        caller_line = caller_source[caller_lineno]
+        col, end_col = span
+        if not caller_line.isascii():
+            col = len(caller_line[:col].encode('utf-8'))
+            end_col = len(caller_line[:end_col].encode('utf-8'))
+        self.edits.replace_span(lineno, col, end_col, len(fill.encode('utf-8')))
+
+    def _is_rewritten(self, frame: FrameT) -> bool:
+        return (frame.f_code, frame.f_lasti) in self.rewritten_sites
 
-        accessor = self._find_accesspoint(caller_line, key, frame_vars)
+    def _mark_rewritten(self, frame: FrameT) -> None:
+        # only once the edit is made (or queued), so that a site that failed
+        # to rewrite gets another go on its next hit
+        self.rewritten_sites.add((frame.f_code, frame.f_lasti))
 
-        caller_source[caller_lineno] = caller_line.replace(accessor, fill)
-        with open(fname, 'w') as out_f:
-            out_f.writelines(caller_source)
+    def rewrite_single(
+            self,
+            key: PlaceholderAccessor,
+            fill: CodeFillSingleT,
+            frame: FrameT,
+            frame_vars: FrameVarsT,
+    ) -> None:
+        with self.lock:
+            if self._is_rewritten(frame):
+                return
+            fname = frame.f_globals['__file__']
+            self._sync_edits()
+            with self.caller_source(fname) as caller_source:
+                caller_lineno = self.edits.line(frame.f_lineno - 1)
+                caller_line = caller_source.line(caller_lineno)
+
+                span = self.locate(
+                    fname, caller_lineno, caller_line, key, frame, frame_vars
+                )
+
+                if self.queued():
+                    self._queue(caller_lineno, span, fill, False)
+                    self._mark_rewritten(frame)
+                    return
+
+                caller_source.splice({
+                    caller_lineno: self._splice_single(caller_line, span, fill)
+                })
+            self._mark_rewritten(frame)
+            note_own_write(fname)
+            self._record_span(caller_lineno, caller_line, span, fill)
 
     def rewrite_multi(
             self,
@@ -379,32 +1381,589 @@ class RewriteContext:
             frame: FrameT,
             frame_vars: FrameVarsT,
     ) -> None:
-        fname = frame.f_globals['__file__']
-        with open(fname, 'r') as in_f:
-            caller_source = in_f.readlines()
-        caller_lineno = frame.f_lineno - 1 + self.offset
-        caller_line = caller_source[caller_lineno]
-
-        accessor = self._find_accesspoint(caller_line, key, frame_vars)
-        if set(caller_line.replace(accessor, '')) > {'', '\t', '\n'}:
-            print(set(caller_line.replace(accessor, '')))
-            raise ValueError(
-                'A multi-line placeholder must be the only statement on the '
-                'line it is called from. '
+        with self.lock:
+            if self._is_rewritten(frame):
+                return
+            fname = frame.f_globals['__file__']
+            self._sync_edits()
+            with self.caller_source(fname) as caller_source:
+                caller_lineno = self.edits.line(frame.f_lineno - 1)
+                caller_line = caller_source.line(caller_lineno)
+
+                span = self.locate(
+                    fname, caller_lineno, caller_line, key, frame, frame_vars
+                )
+                new_lines = self._splice_multi(caller_line, span, fill)
+
+                if self.queued():
+                    self._queue(caller_lineno, span, fill, True)
+                    self._mark_rewritten(frame)
+                    return
+
+                caller_source.splice({caller_lineno: ''.join(new_lines)})
+            self._mark_rewritten(frame)
+            note_own_write(fname)
+            self.edits.replace_line(caller_lineno, len(new_lines))
+
+    def _drop_stale(self) -> None:
+        # Edits located in an older version of the file can't be put anywhere
+        # safely, the lines they point at may hold anything by now
+        version = source_version(self.filename)
+        stale = [
+            position for position, (_, _, edit_version) in self.pending.items()
+            if edit_version != version
+        ]
+        if not stale:
+            return
+        import warnings
+        warnings.warn(
+            '{} changed since placeholder queued edits to it, so {} of them '
+            'were dropped instead of written to the wrong place'.format(
+                self.filename, len(stale)
+            ),
+            RuntimeWarning,
+        )
+        for position in stale:
+            del self.pending[position]
+
+    def flush(self) -> None:
+        """
+        Apply every pending deferred edit with a single pass over the file.
+        """
+        from todo.splice import SourceFile
+
+        with self.lock:
+            if not self.pending:
+                return
+            start = time.perf_counter()
+            self._release_source()
+            self._drop_stale()
+            if not self.pending:
+                return
+            _before_own_write(self.filename)
+            caller_source = SourceFile(self.filename)
+
+            by_line: Dict[int, List[Tuple[SpanT, CodeFillT, bool]]] = {}
+            for (lineno, span), (fill, multi, _) in self.pending.items():
+                by_line.setdefault(lineno, []).append((span, fill, multi))
+
+            # bottom-up and right-to-left, so that no edit moves the text under
+            # another one; that's also the order they go in the edit log
+            edits = {}
+            logged = []
+            with caller_source:
+                for lineno in sorted(by_line, reverse=True):
+                    caller_line = caller_source.line(lineno)
+                    new_lines = [caller_line]
+                    for span, fill, multi in sorted(
+                            by_line[lineno], reverse=True
+                    ):
+                        if multi:
+                            new_lines = self._splice_multi(
+                                caller_line, span, fill
+                            )
+                            logged.append((lineno, None, None, new_lines))
+                            break
+                        logged.append((lineno, caller_line, span, fill))
+                        caller_line = self._splice_single(
+                            caller_line, span, fill
+                        )
+                        new_lines = [caller_line]
+                    edits[lineno] = ''.join(new_lines)
+                caller_source.splice(edits)
+            note_own_write(self.filename)
+
+            self.pending.clear()
+            for lineno, caller_line, span, fill in logged:
+                if span is None:
+                    self.edits.replace_line(lineno, len(fill))
+                else:
+                    self._record_span(lineno, caller_line, span, fill)
+
+            if default_instrumentation is not None:
+                default_instrumentation.record(
+                    'rewrite',
+                    time.perf_counter() - start,
+                    (self.filename, '<flush>', 'deferred'),
+                )
+
+
+def flush() -> None:
+    """
+    Write out all source rewrites that are waiting on a deferred flush.
+
+    This runs automatically at interpreter exit, so you only need to call it if
+    you want to see the edits while your program is still running.
+    """
+    for rewrite_ctx in list(default_rewrite_ctx.values()):
+        rewrite_ctx.flush()
+
+
+def defer_rewrites(enabled: bool = True) -> None:
+    """
+    Toggle deferred source rewriting.
+
+    By default every placeholder access rewrites the calling file right away.
+    With deferred rewriting on, edits are collected in memory (repeated hits on
+    the same call site collapse into one edit) and each file is rewritten once,
+    at interpreter exit or on a call to `todo.flush()`.
+
+    Turning deferred rewriting off flushes anything still pending.
+    """
+    if not enabled:
+        flush()
+    RewriteContext.deferred = enabled
+
+
+atexit.register(flush)
+
+
+def use_store(path: Optional[str]) -> None:
+    """
+    Keep fills in a file on disk, shared between runs and between processes.
+
+    Before prompting for a key, placeholder checks the store for a fill made
+    under the same source file, replace mode and key; new fills are appended to
+    it. Pass None to stop using a store.
+
+    Setting the `TODO_PLACEHOLDER_STORE` environment variable to a path does the
+    same thing at import time.
+    """
+    global default_store
+    if path is None:
+        default_store = None
+        return
+    from todo.store import FillStore
+    default_store = FillStore(path)
+    default_store.load()
+
+
+if os.environ.get('TODO_PLACEHOLDER_STORE'):
+    use_store(os.environ['TODO_PLACEHOLDER_STORE'])
+
+
+def use_snapshots(directory: Optional[str]) -> None:
+    """
+    Never prompt: a placeholder with no fill writes a snapshot of its frame to
+    `directory` and raises instead, so nothing sits waiting on a terminal.
+    Fill it in later with `python -m todo fill <snapshot>`, which puts the fill
+    in the store for the next hit to find. That needs a store (see
+    `use_store`), without one the placeholder just raises. Pass None to prompt
+    again.
+
+    Setting `TODO_PLACEHOLDER_SNAPSHOTS` to a directory does the same thing at
+    import time.
+    """
+    global default_snapshot_dir
+    default_snapshot_dir = directory
+
+
+if os.environ.get('TODO_PLACEHOLDER_SNAPSHOTS'):
+    use_snapshots(os.environ['TODO_PLACEHOLDER_SNAPSHOTS'])
+
+if os.environ.get('TODO_PLACEHOLDER_FREEZE'):
+    from todo.frozen import freeze
+    freeze()
+
+
+def set_input(
+        source: Union[InputSource, Callable[[Optional[str], str], str], None],
+) -> None:
+    """
+    Choose where placeholder sessions read their input from, so placeholders
+    can be filled without anyone at a terminal.
+
+    `source` can be:
+        - a `todo.ScriptedInput`, with canned answers per key
+        - a `todo.StreamInput`, reading sessions one after another from a file
+          or pipe
+        - a function `fn(key, prompt) -> str` that raises EOFError to end the
+          session
+        - None, to go back to reading from the terminal
+
+    Setting `TODO_PLACEHOLDER_INPUT` in the environment to the path of a JSON
+    file of answers (see `ScriptedInput`), or to "-" to read sessions from
+    stdin, does the same thing at import time.
+    """
+    global default_input
+    if source is None:
+        source = TerminalInput()
+    elif not isinstance(source, InputSource):
+        source = CallableInput(source)
+    default_input = source
+
+
+def instrument(enabled: bool = True, report_at_exit: bool = False) -> None:
+    """
+    Record hit counts and timings for every placeholder access, per
+    (file, key, mode) and per phase (prompt, evaluate, locate, rewrite). Read
+    them back with `todo.stats()`.
+
+    With `report_at_exit`, a table of everything recorded is printed to stderr
+    when the interpreter exits. Setting `TODO_PLACEHOLDER_STATS=1` in the
+    environment turns both on at import time.
+
+    Instrumentation is off by default, and costs close to nothing while off.
+    """
+    global default_instrumentation, _report_registered
+    if not enabled:
+        default_instrumentation = None
+    elif default_instrumentation is None:
+        default_instrumentation = Instrumentation()
+    _update_plain_hits()
+    if enabled and report_at_exit and not _report_registered:
+        _report_registered = True
+        atexit.register(_report_stats)
+
+
+def cache_fills(
+        limit: Optional[int] = None,
+        remember_anonymous: bool = False,
+) -> None:
+    """
+    Tune how fills are kept in memory, for long-running processes.
+
+    With a `limit`, each session keeps at most that many fills and forgets the
+    least recently used ones past it (they come back from the store, if you use
+    one, or get prompted for again). None means no limit, which is the default.
+
+    With `remember_anonymous`, a `set_placeholder()` with no key gets its fill
+    remembered for that call site, instead of prompting on every hit.
+
+    Fills are always tied to the state of their source file: once the file is
+    changed by something other than placeholder itself, say you edited it and
+    reloaded the module, its fills are made again.
+    """
+    global default_fill_limit, default_remember_anonymous
+    if limit is not None and limit < 1:
+        raise ValueError('Fill limit must be at least 1, got {}'.format(limit))
+    default_fill_limit = limit
+    default_remember_anonymous = remember_anonymous
+    _update_plain_hits()
+    if limit is not None:
+        for session in _all_sessions():
+            while len(session.fills) > limit:
+                session.forget(next(iter(session.fills)))
+
+
+def _update_plain_hits() -> None:
+    global _plain_hits
+    _plain_hits = default_instrumentation is None and default_fill_limit is None
+
+
+def _all_sessions() -> List['PlaceholderSession']:
+    sessions = {id(s): s for s in default_session.values()}
+    for session in list(default_object_sessions):
+        sessions.setdefault(id(session), session)
+    for session in list(default_owner_sessions.values()):
+        sessions.setdefault(id(session), session)
+    for site in list(default_call_sites.values()):
+        sessions.setdefault(id(site.session), site.session)
+    return list(sessions.values())
+
+
+_report_registered = False
+
+
+def _report_stats() -> None:
+    if default_instrumentation is not None:
+        default_instrumentation.report()
+
+
+def stats(
+        filename: Optional[str] = None,
+        key: Optional[str] = None,
+        mode: Optional[str] = None,
+        phase: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Placeholder stats recorded since `todo.instrument()` was called, filtered
+    on whichever of the arguments are given.
+
+    Each entry is a dict with "file", "key", "mode", "phase", "count", and the
+    "total" and "max" time spent, in seconds.
+    """
+    if default_instrumentation is None:
+        return []
+    return default_instrumentation.query(filename, key, mode, phase)
+
+
+if os.environ.get('TODO_PLACEHOLDER_STATS'):
+    instrument(report_at_exit=True)
+
+if os.environ.get('TODO_PLACEHOLDER_INPUT') == '-':
+    set_input(StreamInput(sys.stdin))
+elif os.environ.get('TODO_PLACEHOLDER_INPUT'):
+    set_input(ScriptedInput.from_file(os.environ['TODO_PLACEHOLDER_INPUT']))
+
+
+_NOT_FOUND = object()
+
+
+class FillMemo:
+    """
+    Results of one call site's fill, keyed on the values of the variables it
+    reads, least recently used first.
+    """
+
+    default_size = 128
+
+    def __init__(self, source: str, memoize: Union[bool, int]):
+        import ast
+
+        self.size = self.size_for(memoize)
+        tree = ast.parse(source)
+        # every name read anywhere, even ones the fill binds itself first or
+        # that belong to a comprehension: a key with a name too many still
+        # only matches when it should. `x += 1` and `del x` read x too
+        free = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(
+                    node.ctx, (ast.Load, ast.Del)
+            ):
+                free.add(node.id)
+            elif isinstance(node, ast.AugAssign) and isinstance(
+                    node.target, ast.Name
+            ):
+                free.add(node.target.id)
+        self.free: Tuple[str, ...] = tuple(sorted(free))
+        # names the fill may set in the frame; nested scopes keep theirs
+        bound = set()
+        nodes = [tree]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+                bound.add(node.id)
+            elif isinstance(node, (
+                    ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef
+            )):
+                bound.add(node.name)
+                continue
+            elif isinstance(node, (
+                    ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp,
+                    ast.GeneratorExp,
+            )):
+                continue
+            nodes.extend(ast.iter_child_nodes(node))
+        self.bound: Tuple[str, ...] = tuple(sorted(bound))
+        # key -> (value, variables the fill set, unhashable inputs)
+        self.results: Dict[Tuple, Tuple[ValueT, Dict[str, Any], Tuple]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def size_for(cls, memoize: Union[bool, int]) -> int:
+        if memoize is True:
+            return cls.default_size
+        if not memoize:
+            return 0
+        if memoize < 1:
+            raise ValueError('memoize must be True or a size of at least 1')
+        return memoize
+
+    def snapshot(self, frame: FrameT) -> Tuple[Tuple, Tuple, Dict[str, Any]]:
+        """
+        (key, unhashable inputs, bound names' values) for the fill's inputs in
+        `frame`, taken before it runs. The unhashable inputs are kept alive
+        with the result, so that their ids can't be reused by something else
+        while the key is around.
+        """
+        f_locals = frame.f_locals
+        f_globals = frame.f_globals
+        f_builtins = frame.f_builtins
+        key = []
+        pinned = []
+        for name in self.free:
+            value = f_locals.get(name, _NOT_FOUND)
+            if value is _NOT_FOUND:
+                value = f_globals.get(name, _NOT_FOUND)
+                if value is _NOT_FOUND:
+                    value = f_builtins.get(name, _NOT_FOUND)
+            try:
+                hash(value)
+            except TypeError:
+                pinned.append(value)
+                key.append((None, id(value)))
+            else:
+                key.append((type(value), value))
+        before = {name: f_locals.get(name, _NOT_FOUND) for name in self.bound}
+        return tuple(key), tuple(pinned), before
+
+    def store(
+            self,
+            frame: FrameT,
+            snapshot: Tuple[Tuple, Tuple, Dict[str, Any]],
+            value: ValueT,
+    ) -> None:
+        """
+        Keep `value` for the inputs in `snapshot`, once the fill has run and
+        its variables are in the frame.
+        """
+        key, pinned, before = snapshot
+        f_locals = frame.f_locals
+        if any(
+                before[name] is not _NOT_FOUND and name not in f_locals
+                for name in self.bound
+        ):
+            return  # a hit can't replay a `del`, so it has to run every time
+        # only what the fill actually set, for the frame to get on a hit
+        updates = {
+            name: f_locals[name] for name in self.bound
+            if name in f_locals and f_locals[name] is not before[name]
+        }
+        with self._lock:
+            self.results.pop(key, None)
+            self.results[key] = (value, updates, pinned)
+            while len(self.results) > self.size:
+                del self.results[next(iter(self.results))]
+
+    def evaluate(
+            self,
+            frame: FrameT,
+            run: Callable[[FrameT], ValueT],
+    ) -> ValueT:
+        snapshot = self.snapshot(frame)
+        with self._lock:
+            result = self.results.pop(snapshot[0], None)
+            if result is not None:
+                self.results[snapshot[0]] = result
+        if result is None:
+            value = run(frame)
+            self.store(frame, snapshot, value)
+            return value
+        value, updates, _ = result
+        inject_vars(frame, updates)
+        return value
+
+
+class CallSite:
+    """
+    A placeholder call site that has already been filled (and rewritten, if
+    rewriting was on), keyed in `default_call_sites` by the code object and
+    instruction offset of the access.
+
+    Later hits on the site skip straight to evaluating the compiled fill, as
+    long as they come from the very code object it was made for: code objects
+    compare equal by value, so a reloaded module's unchanged function would
+    otherwise pick up a site whose fill is stale.
+    """
+
+    __slots__ = (
+        'name', 'via', 'parent', 'replace_mode', 'session', 'fill', 'compiled',
+        'direct', 'rewritten', 'filename', 'code', 'memo',
+    )
+
+    def __init__(
+            self,
+            key: PlaceholderAccessor,
+            replace_mode: Optional[str],
+            session: PlaceholderSession,
+            fill: CodeFillT,
+            rewritten: bool,
+            filename: str,
+            code: CodeType,
+            memo: Optional[FillMemo] = None,
+    ):
+        self.name = key.name
+        self.via = key.via
+        self.parent = key.parent
+        self.replace_mode = replace_mode
+        self.session = session
+        self.fill = fill
+        self.compiled = session.compile_fill(fill)
+        # see `set_placeholder(memoize=...)`
+        self.memo = memo
+        # can be evaluated straight against the frame, no namespace view needed
+        self.direct = self.memo is None and self._is_direct(
+            session, fill, self.compiled
+        )
+        # False if the access was left in place because rewriting is off
+        self.rewritten = rewritten
+        self.filename = filename
+        self.code = code
+
+    def matches(
+            self,
+            key: Union[str, PlaceholderAccessor, None],
+            replace_mode: Optional[str],
+            session: Optional[PlaceholderSession],
+            memoize: Union[bool, int] = False,
+    ) -> bool:
+        if self.session.fills.get(self.name) is not self.fill:
+            return False
+        if (self.memo.size if self.memo else 0) != FillMemo.size_for(memoize):
+            return False
+        if key is None:
+            return (
+                self.via == 'anonymous'
+                and default_remember_anonymous
+                and session is None
+                and self.replace_mode == (replace_mode or 'expression')
             )
+        if isinstance(key, str):
+            return (
+                self.via == 'call'
+                and self.name == key
+                and session is None
+                and self.replace_mode == (replace_mode or 'expression')
+            )
+        if isinstance(key, PlaceholderAccessor):
+            return (
+                self.via == key.via
+                and self.name == key.name
+                and self.parent is key.parent
+                and self.session is session
+            )
+        return False
 
-        indent = caller_line[:caller_line.find(accessor)]
+    @staticmethod
+    def _is_direct(
+            session: PlaceholderSession,
+            fill: CodeFillT,
+            compiled: CodeType,
+    ) -> bool:
+        # A plain expression that assigns nothing and has no nested scopes
+        # needs nothing written back, so the frame's own locals will do.
+        import ast
 
-        caller_source.pop(caller_lineno)
-        lineno = caller_lineno
-        for line in fill:
-            caller_source.insert(lineno, indent + line + '\n')
-            lineno += 1
+        if not isinstance(session, ExpressionPlaceholderSession):
+            return False
+        if any(isinstance(c, CodeType) for c in compiled.co_consts):
+            return False
+        return not any(
+            isinstance(node, ast.NamedExpr)
+            for node in ast.walk(ast.parse(fill, mode='eval'))
+        )
 
-        with open(fname, 'w') as out_f:
-            out_f.writelines(caller_source)
+    def evaluate(self, frame: FrameT) -> ValueT:
+        if not _plain_hits:
+            if default_fill_limit is not None:
+                self.session.touch(self.name)
+            if default_instrumentation is not None:
+                return self._evaluate_timed(frame)
+        if self.direct:
+            return eval(self.compiled, frame.f_globals, frame.f_locals)
+        if self.memo is not None:
+            return self.memo.evaluate(frame, self._run)
+        return self._run(frame)
+
+    def _run(self, frame: FrameT) -> ValueT:
+        value, updates = self.session.run_fill(
+            self.compiled, get_frame_vars(frame)
+        )
+        inject_vars(frame, updates)
+        return value
 
-        self.offset += -1 + len(fill)
+    def _evaluate_timed(self, frame: FrameT) -> ValueT:
+        start = time.perf_counter()
+        if self.memo is not None:
+            value = self.memo.evaluate(frame, self._run)
+        else:
+            value = self._run(frame)
+        elapsed = time.perf_counter() - start
+        site = (self.filename, self.name, self.session.mode)
+        default_instrumentation.record('evaluate', elapsed, site)
+        default_instrumentation.record('access', elapsed, site)
+        return value
 
 
 def set_placeholder(
@@ -412,6 +1971,7 @@ def set_placeholder(
     replace_mode: str = None,
     rewrite_source: bool = True,
     allow_propagation: bool = False,
+    memoize: Union[bool, int] = False,
     _session: PlaceholderSession = None,
     _base_filename: str = None,
     _frame: FrameT = None,
@@ -461,6 +2021,14 @@ def set_placeholder(
         first created.
         When calling `set_placeholder` directly, this flag will do nothing under
         normal circumstances, and is safe to ignore.
+    :param memoize:
+        For fills that always give the same result for the same inputs: every
+        variable the fill reads is looked up, and if they're all the same as
+        on an earlier hit of this call site, that hit's result is used instead
+        of running the fill. Hashable values are compared by value, anything
+        else by identity, so changing an input in place goes unnoticed.
+        Pass a number to keep that many results (least recently used go
+        first), True keeps 128.
     :param _session:
         Used internally by placeholder objects. Safe to ignore.
     :param _base_filename:
@@ -470,69 +2038,428 @@ def set_placeholder(
     """
     frame = _frame
     if frame is None:
-        frame = inspect.currentframe().f_back
+        frame = sys._getframe(1)
+
+    site_key = (frame.f_code, frame.f_lasti)
+    site = default_call_sites.get(site_key)
+    if (
+            site is not None
+            and site.code is frame.f_code
+            and site.matches(key, replace_mode, _session, memoize)
+    ):
+        return site.evaluate(frame)
+
     filename = frame.f_globals['__file__']
+    session, replace_mode = _resolve_session(filename, replace_mode, _session)
+    rewrite_ctx = _resolve_rewrite_ctx(
+        filename, rewrite_source, allow_propagation, _base_filename
+    )
+    key = _resolve_key(key, set_placeholder)
+    if key.name is None and default_remember_anonymous:
+        key = _anonymous_site_key(key, frame)
+
+    with _timed_site(filename, key.name, session.mode):
+        frame_vars = get_frame_vars(frame)
+        fill = session.get_fill(key, frame_vars)
+        return _finish_access(
+            frame, frame, site_key, filename, session, rewrite_ctx, key,
+            replace_mode, fill, frame_vars, memoize,
+        )
 
-    session = _session
-    if session is None:
-        if replace_mode is None:
-            replace_mode = 'expression'
-        if (filename, replace_mode) not in default_session:
-            session_t = {
-                'expression': ExpressionPlaceholderSession,
-                'statement': StatementPlaceholderSession,
-                'multiline': MultilinePlaceholderSession,
-            }.get(replace_mode)
-            if session_t is None:
-                raise ValueError('Invalid replace mode {}'.format(replace_mode))
-            default_session[(filename, replace_mode)] = session_t()
-        session = default_session[(filename, replace_mode)]
-    elif replace_mode is not None:
-        raise ValueError('Cannot provide both `replace_mode` and Session')
-
-    base_filename = _base_filename
-    if rewrite_source:
-        if any([
-                base_filename is None,
-                (base_filename == filename),
-                allow_propagation,
-        ]):
-            if filename not in default_rewrite_ctx:
-                default_rewrite_ctx[filename] = RewriteContext(filename)
-            rewrite_ctx = default_rewrite_ctx[filename]
-        else:
-            raise ValueError((
-                'Tried to edit file {}, but the placeholder was initialized in '
-                'file {}. This is a safeguard to prevent you from editing '
-                'files you did not intend to edit, pass `allow_propagation` to '
-                'enable this behavior. '
-            ).format(filename, base_filename))
-    else:
-        rewrite_ctx = None
 
-    if key is None:
-        key = PlaceholderAccessor(None, 'anonymous', set_placeholder)
-    elif isinstance(key, str):
-        key = PlaceholderAccessor(key, 'call', set_placeholder)
-    elif not isinstance(key, PlaceholderAccessor):
-        raise ValueError('Invalid key {} of type {}'.format(key, type(key)))
+async def aset_placeholder(
+    key: Optional[str] = None,
+    replace_mode: str = None,
+    rewrite_source: bool = True,
+    allow_propagation: bool = False,
+    memoize: Union[bool, int] = False,
+):
+    """
+    `set_placeholder`, for use inside coroutines:
+
+        value = await todo.aset_placeholder('key')
+
+    The interactive session runs in the event loop's default executor, so other
+    tasks keep running while you work out the fill, and tasks that need the
+    same key wait for that one session. Once filled, the whole
+    `await todo.aset_placeholder(...)` expression is rewritten in source.
+
+    Parameters are the same as for `set_placeholder`.
+    """
+    frame = sys._getframe(1)
+
+    site_key = (frame.f_code, frame.f_lasti)
+    site = default_call_sites.get(site_key)
+    if (
+            site is not None
+            and site.code is frame.f_code
+            and site.matches(key, replace_mode, None, memoize)
+    ):
+        return site.evaluate(frame)
+
+    filename = frame.f_globals['__file__']
+    session, replace_mode = _resolve_session(filename, replace_mode, None)
+    rewrite_ctx = _resolve_rewrite_ctx(
+        filename, rewrite_source, allow_propagation, None
+    )
+    key = _resolve_key(key, aset_placeholder, awaited=True)
+    if key.name is None and default_remember_anonymous:
+        key = _anonymous_site_key(key, frame)
+
+    # the frame moves on while we're waiting, so hold on to where it was
+    pinned_frame = PinnedFrame(frame)
+    fill = await session.aget_fill(key, get_frame_vars(frame))
+
+    with _timed_site(filename, key.name, session.mode):
+        return _finish_access(
+            frame, pinned_frame, site_key, filename, session, rewrite_ctx, key,
+            replace_mode, fill, None, memoize,
+        )
+
+
+def _is_ndarray(obj: Any) -> bool:
+    # without importing numpy, which might not even be installed
+    t = type(obj)
+    return t.__module__ == 'numpy' and t.__name__ == 'ndarray'
+
+
+def _batch_function(
+        session: PlaceholderSession,
+        key: str,
+        fill: ExpressionFill,
+        name: str,
+        frame: FrameT,
+) -> Callable[[Any], ValueT]:
+    """
+    `fill` as a function of `name`, with the caller's locals it uses bound
+    once up front. Its globals are the caller's, so those stay live.
+    """
+    import ast
+
+    f_locals = frame.f_locals
+    free = []
+    if f_locals is not frame.f_globals:
+        loaded = {
+            node.id for node in ast.walk(ast.parse(fill, mode='eval'))
+            if isinstance(node, ast.Name)
+        }
+        free = sorted(n for n in loaded if n != name and n in f_locals)
+
+    # per key, so that it goes when the key's fill does
+    cache = session.batch_compiled.setdefault(key, {})
+    cache_key = (name, tuple(free))
+    compiled = cache.get(cache_key)
+    if compiled is None:
+        source = 'lambda {}: lambda {}: ({})'.format(
+            ', '.join(free), name, fill
+        )
+        compiled = compile(source, '<placeholder>', 'eval')
+        cache[cache_key] = compiled
+    factory = eval(compiled, frame.f_globals)
+    return factory(*[f_locals[n] for n in free])
+
+
+def map_placeholder(
+    key: str,
+    iterable: Iterable[Any],
+    name: str = 'row',
+    vectorize: bool = False,
+) -> Union[Iterator[ValueT], Any]:
+    """
+    Evaluate the expression placeholder `key` for every item of `iterable`,
+    with the item bound to `name`:
+
+        totals = todo.map_placeholder('total', orders, name='order')
 
-    frame_vars = get_frame_vars(frame)
-    fill = session.get_fill(key, frame_vars)
-    frame_vars = get_frame_vars(frame)
-    value, updates = session.evaluate_fill(fill, frame_vars)
+    If `key` isn't filled yet, you get a session with `name` bound to the
+    first item. The fill is compiled once into a function of `name` and the
+    caller's variables, and results are generated lazily, one per item.
 
+    With a NumPy array and `vectorize=True`, the fill is run once on the
+    whole array instead, which is much faster for something like
+    `row * 2 + offset`, and whatever it gives is returned as is. Only do that
+    for fills that mean the same thing for the whole array as for each row:
+    `row[0]` is the first element of one row, but the first row of the array.
+
+    Keys are shared with `set_placeholder('key')` from the same file. The
+    call itself is not rewritten in source.
+    """
+    if not isinstance(key, str):
+        raise ValueError('map_placeholder needs a string key')
+    frame = sys._getframe(1)
+    filename = frame.f_globals['__file__']
+    session, _ = _resolve_session(filename, 'expression', None)
+    accessor = _resolve_key(key, map_placeholder)
+
+    if vectorize and not _is_ndarray(iterable):
+        raise ValueError('vectorize=True needs a NumPy array')
+
+    items = iter(iterable)
+    fill = session.current_fill(key)
+    if fill is None:
+        try:
+            first = next(items)
+        except StopIteration:
+            return iter(())
+        items = itertools.chain([first], items)
+        frame_vars = dict(get_frame_vars(frame))
+        frame_vars[name] = first
+        with _timed_site(filename, key, session.mode):
+            fill = session.get_fill(accessor, frame_vars)
+
+    fn = _batch_function(session, key, fill, name, frame)
+    if vectorize:
+        return fn(iterable)
+    return (fn(item) for item in items)
+
+
+class PinnedFrame:
+    """
+    The parts of a frame the rewriter looks at, as they were when captured.
+    """
+
+    def __init__(self, frame: FrameT):
+        self.f_code = frame.f_code
+        self.f_globals = frame.f_globals
+        self.f_lineno = frame.f_lineno
+        self.f_lasti = frame.f_lasti
+
+
+def _resolve_session(
+        filename: str,
+        replace_mode: Optional[str],
+        session: Optional[PlaceholderSession],
+) -> Tuple[PlaceholderSession, Optional[str]]:
+    if session is not None:
+        if replace_mode is not None:
+            raise ValueError('Cannot provide both `replace_mode` and Session')
+        return session, replace_mode
+
+    if replace_mode is None:
+        replace_mode = 'expression'
+    if (filename, replace_mode) not in default_session:
+        session_t = _session_type(replace_mode)
+        # setdefault, so that racing threads all end up with one session
+        default_session.setdefault(
+            (filename, replace_mode), session_t(filename)
+        )
+    return default_session[(filename, replace_mode)], replace_mode
+
+
+def _session_type(replace_mode: str) -> Type[PlaceholderSession]:
+    session_t = {
+        'expression': ExpressionPlaceholderSession,
+        'statement': StatementPlaceholderSession,
+        'multiline': MultilinePlaceholderSession,
+    }.get(replace_mode)
+    if session_t is None:
+        raise ValueError('Invalid replace mode {}'.format(replace_mode))
+    return session_t
+
+
+def _object_owner(filename: str, lineno: int) -> str:
+    """
+    The owner of a placeholder object made on line `lineno` of `filename`: the
+    name it's bound to, or the line, if it's made some other way. The line is
+    the one the running code was compiled with, so it's looked up where this
+    process's rewrites of the file have moved it to.
+    """
+    from todo.sites import bound_name_at
+
+    rewrite_ctx = default_rewrite_ctx.get(filename)
     if rewrite_ctx is not None:
-        if isinstance(session, MultilinePlaceholderSession):
-            rewrite_ctx.rewrite_multi(key, fill, frame, frame_vars)
+        with rewrite_ctx.lock:
+            # after someone else's edit, there's no telling where it went
+            if rewrite_ctx.edits_version == source_version(filename):
+                lineno = rewrite_ctx.edits.line(lineno - 1) + 1
+    return bound_name_at(filename, lineno) or '<line {}>'.format(lineno)
+
+
+_owner_lock = threading.Lock()
+
+
+def _owner_session(
+        filename: str,
+        mode: str,
+        owner: Optional[str],
+) -> PlaceholderSession:
+    """
+    The session for fills of `owner` (see `PlaceholderSession.owner`): the
+    shared one for None, otherwise that placeholder object's, or a stand-in
+    for it when this process has no such object, e.g. a broker serving
+    workers that do.
+    """
+    if owner is None:
+        return _resolve_session(filename, mode, None)[0]
+    with _owner_lock:
+        session = _object_session(filename, mode, owner)
+        if session is None:
+            session = _session_type(mode)(filename, owner=owner)
+            default_owner_sessions[(filename, mode, owner)] = session
+        return session
+
+
+def _object_session(
+        filename: str,
+        mode: str,
+        owner: str,
+) -> Optional[PlaceholderSession]:
+    for session in list(default_object_sessions):
+        if (
+                session.filename == filename
+                and session.mode == mode
+                and session.owner == owner
+        ):
+            return session
+    return default_owner_sessions.get((filename, mode, owner))
+
+
+def known_fill(
+        filename: str,
+        mode: str,
+        key: str,
+        owner: Optional[str] = None,
+) -> Optional[CodeFillT]:
+    """
+    The fill an access with this file, mode, key and owner would get without
+    prompting, if any.
+    """
+    fill = default_prefill.get((os.path.abspath(filename), mode, key, owner))
+    if fill is None and default_store is not None:
+        fill = default_store.get(filename, mode, key, owner)
+    if fill is None:
+        if owner is None:
+            session = default_session.get((filename, mode))
         else:
-            rewrite_ctx.rewrite_single(key, fill, frame, frame_vars)
+            session = _object_session(filename, mode, owner)
+        if session is not None:
+            fill = session.current_fill(key)
+    return fill
+
+
+def _resolve_rewrite_ctx(
+        filename: str,
+        rewrite_source: bool,
+        allow_propagation: bool,
+        base_filename: Optional[str],
+) -> Optional[RewriteContext]:
+    if not rewrite_source:
+        return None
+    if any([
+            base_filename is None,
+            (base_filename == filename),
+            allow_propagation,
+    ]):
+        if filename not in default_rewrite_ctx:
+            default_rewrite_ctx.setdefault(filename, RewriteContext(filename))
+        return default_rewrite_ctx[filename]
+    raise ValueError((
+        'Tried to edit file {}, but the placeholder was initialized in '
+        'file {}. This is a safeguard to prevent you from editing '
+        'files you did not intend to edit, pass `allow_propagation` to '
+        'enable this behavior. '
+    ).format(filename, base_filename))
+
+
+def _resolve_key(
+        key: Union[str, PlaceholderAccessor, None],
+        parent: Callable,
+        awaited: bool = False,
+) -> PlaceholderAccessor:
+    if isinstance(key, PlaceholderAccessor):
+        return key
+    if key is not None and not isinstance(key, str):
+        raise ValueError('Invalid key {} of type {}'.format(key, type(key)))
+    accessors = _call_accessors.get(key)
+    if accessors is None:
+        accessors = _call_accessors.setdefault(key, {})
+    accessor = accessors.get((parent, awaited))
+    if accessor is None:
+        via = 'anonymous' if key is None else 'call'
+        accessor = accessors.setdefault(
+            (parent, awaited), PlaceholderAccessor(key, via, parent, awaited)
+        )
+    return accessor
+
+
+def _anonymous_site_key(
+        key: PlaceholderAccessor,
+        frame: FrameT,
+) -> PlaceholderAccessor:
+    # a name of its own for each call site, that no `set_placeholder('...')`
+    # can clash with. Lambdas all have the same name, and other functions can
+    # too, so it's the place in source that tells them apart: where the code
+    # starts, and where the call is when the interpreter knows its column
+    # (two lambdas on one line start at the same place).
+    code = frame.f_code
+    position = frame_position(frame)
+    name = '<anonymous {} {}:{}@{}>'.format(
+        getattr(code, 'co_qualname', code.co_name),
+        code.co_firstlineno,
+        position[1] if position is not None else '',
+        frame.f_lasti,
+    )
+    return PlaceholderAccessor(name, 'anonymous', key.parent, key.awaited)
+
+
+def _finish_access(
+        frame: FrameT,
+        rewrite_frame: FrameT,
+        site_key: Tuple[CodeType, int],
+        filename: str,
+        session: PlaceholderSession,
+        rewrite_ctx: Optional[RewriteContext],
+        key: PlaceholderAccessor,
+        replace_mode: Optional[str],
+        fill: CodeFillT,
+        frame_vars: Optional['FrameNamespace'] = None,
+        memoize: Union[bool, int] = False,
+) -> ValueT:
+    """
+    Everything after the fill is known: evaluate it (unless the session that
+    came up with it against these `frame_vars` already did), rewrite the
+    access, and remember the call site for next time.
+    """
+    memo = memo_snapshot = None
+    if memoize and key.name is not None:
+        # keyed on the inputs as they were before this first run
+        memo = FillMemo(session.fill_source(fill), memoize)
+        memo_snapshot = memo.snapshot(frame)
+
+    result = frame_vars.session_result if frame_vars is not None else None
+    if result is not None and result[0] is fill:
+        _, value, updates = result
+        frame_vars.session_result = None
+    else:
+        frame_vars = get_frame_vars(frame)
+        with _timed('evaluate'):
+            value, updates = session.evaluate_fill(fill, frame_vars)
+
+    if rewrite_ctx is not None:
+        with _timed('rewrite'):
+            if isinstance(session, MultilinePlaceholderSession):
+                rewrite_ctx.rewrite_multi(key, fill, rewrite_frame, frame_vars)
+            else:
+                rewrite_ctx.rewrite_single(key, fill, rewrite_frame, frame_vars)
 
     inject_vars(frame, updates)
 
+    if key.name is not None:
+        default_call_sites[site_key] = CallSite(
+            key, replace_mode, session, fill, rewrite_ctx is not None,
+            filename, site_key[0], memo,
+        )
+        if memo is not None:
+            memo.store(frame, memo_snapshot, value)
+        session.call_sites.setdefault(key.name, []).append(site_key)
+
     return value
 
 
+_object_getattribute = object.__getattribute__
+_getframe = sys._getframe
+
+
 class PlaceholderBase(object):
     """
     This is a placeholder context.
@@ -561,12 +2488,21 @@ class PlaceholderBase(object):
     file = open(placeholder.filename, 'r')
     """
 
-    session_t: Type[PlaceholderSession]
+    _session_t: Type[PlaceholderSession]
+
+    # Every attribute access comes through `__getattribute__`: `__getattr__`
+    # would be simpler, but it's only reached after a failed lookup has raised
+    # an AttributeError, which costs more than the whole hit.
+    __slots__ = (
+        '_rewrite_source', '_allow_propagation', '_memoize', '_filename',
+        '_session', '_accessors', '__weakref__',
+    )
 
     def __init__(
         self,
         rewrite_source=True,
         allow_propagation=False,
+        memoize=False,
         _frame=None,
     ):
         """
@@ -587,45 +2523,92 @@ class PlaceholderBase(object):
             where the placeholder context was initialized. `allow_propagation`
             will disable this safeguard.
 
+        :param memoize:
+            Reuse results of fills whose inputs haven't changed since an
+            earlier hit, see `set_placeholder`.
+
         :param _frame:
             If this init function is called via 'super', _frame should be set
             by the calling class.
         """
         self._rewrite_source = rewrite_source
         self._allow_propagation = allow_propagation
-        self._expressions = {}
-        self._session = self._session_t()
-
+        self._memoize = memoize
+        self._accessors: Dict[str, PlaceholderAccessor] = {}
         if _frame is None:
-            _frame = inspect.currentframe().f_back
+            _frame = sys._getframe(1)
         self._filename = _frame.f_locals['__file__']
+        # worked out now, not when first needed, as the file may have been
+        # edited by someone else by then
+        self._session = self._session_t(
+            self._filename,
+            owner=_object_owner(self._filename, _frame.f_lineno),
+        )
+        default_object_sessions.add(self._session)
 
     def __getattribute__(self, key):
-        if key.startswith('_'):
-            return object.__getattribute__(self, key)
-
-        caller_frame = inspect.currentframe().f_back
+        if key[:1] == '_':
+            return _object_getattribute(self, key)
+
+        caller_frame = _getframe(1)
+
+        code = caller_frame.f_code
+        site = default_call_sites.get((code, caller_frame.f_lasti))
+        if (
+                site is not None
+                and site.code is code
+                and site.parent is self
+                and site.name == key
+                and site.session.fills.get(key) is site.fill
+        ):
+            if site.direct and _plain_hits:
+                return eval(
+                    site.compiled, caller_frame.f_globals, caller_frame.f_locals
+                )
+            return site.evaluate(caller_frame)
 
         return set_placeholder(
-            PlaceholderAccessor(key, 'attr', self),
+            self._accessor(key),
             rewrite_source=self._rewrite_source,
             allow_propagation=self._allow_propagation,
+            memoize=self._memoize,
             _session=self._session,
             _base_filename=self._filename,
             _frame=caller_frame,
         )
 
+    def _accessor(self, key: str) -> PlaceholderAccessor:
+        accessor = self._accessors.get(key)
+        if accessor is None:
+            accessor = self._accessors.setdefault(
+                key, PlaceholderAccessor(key, 'attr', self)
+            )
+        return accessor
+
 
 class ExpressionPlaceholder(PlaceholderBase):
+    __slots__ = ()
     _session_t = ExpressionPlaceholderSession
 
 
 class StatementPlaceholder(PlaceholderBase):
+    __slots__ = ()
     _session_t = StatementPlaceholderSession
 
 
 class MultilinePlaceholder(PlaceholderBase):
+    __slots__ = ()
     _session_t = MultilinePlaceholderSession
 
 
 Placeholder = ExpressionPlaceholder
+
+
+if os.environ.get('TODO_PLACEHOLDER_PREFILL'):
+    from todo.batch import prefill
+    try:
+        prefill()
+    except ValueError as e:
+        # e.g. `python -c`, with no script to look in
+        import warnings
+        warnings.warn(str(e), RuntimeWarning)
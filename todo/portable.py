@@ -0,0 +1,76 @@
+"""
+Frame namespaces in a form that can leave the process.
+
+Values that pickle are kept as they are. Anything else (modules, open files,
+sockets, ...) is replaced by a stand-in holding its type and a bounded repr,
+which is still enough to poke at in a session.
+"""
+import pickle
+import reprlib
+from typing import *
+
+
+PortableNamespaceT = Dict[str, Tuple[Optional[bytes], str, str]]
+
+_repr = reprlib.Repr()
+_repr.maxstring = 200
+_repr.maxother = 200
+
+
+class Unpicklable:
+    """
+    Stand-in for a value that couldn't be brought along.
+    """
+
+    def __init__(self, type_name: str, value_repr: str):
+        self.type_name = type_name
+        self.value_repr = value_repr
+
+    def __repr__(self) -> str:
+        return '<unpicklable {}: {}>'.format(self.type_name, self.value_repr)
+
+
+def _type_name(value: Any) -> str:
+    t = type(value)
+    return '{}.{}'.format(t.__module__, t.__qualname__)
+
+
+def freeze_namespace(
+        namespace: Mapping[str, Any],
+        max_bytes: int = 1 << 20,
+) -> PortableNamespaceT:
+    """
+    name -> (pickled value or None, type name, bounded repr). Values that
+    pickle to more than `max_bytes` are left behind too.
+    """
+    frozen = {}
+    for name, value in namespace.items():
+        if name == '__builtins__':
+            continue
+        try:
+            value_repr = _repr.repr(value)
+        except Exception:
+            value_repr = '?'
+        try:
+            data = pickle.dumps(value)
+            if len(data) > max_bytes:
+                data = None
+        except Exception:
+            data = None
+        frozen[name] = (data, _type_name(value), value_repr)
+    return frozen
+
+
+def thaw_namespace(frozen: PortableNamespaceT) -> Dict[str, Any]:
+    namespace = {}
+    for name, (data, type_name, value_repr) in frozen.items():
+        value = None
+        if data is not None:
+            try:
+                value = pickle.loads(data)
+            except Exception:
+                data = None
+        if data is None:
+            value = Unpicklable(type_name, value_repr)
+        namespace[name] = value
+    return namespace
@@ -0,0 +1,252 @@
+"""
+Find every placeholder site in a source tree, without running any of it.
+
+    python -m todo scan [paths...] [--store fills.jsonl] [--unfilled] [--json]
+
+Files are parsed in parallel. What was found is cached per file, keyed by its
+mtime and size, so a rescan only reparses files that changed.
+"""
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+from todo import sites
+
+
+DEFAULT_CACHE = '.todo-scan-cache.json'
+CACHE_VERSION = 4
+
+# below this many files to parse, a process pool costs more than it saves
+_PARALLEL_MIN_FILES = 32
+
+_skip_dirs = {'__pycache__', 'node_modules', 'venv', 'site-packages'}
+
+SiteRecordT = Dict[str, Any]
+
+
+def iter_source_files(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isfile(path):
+            yield os.path.abspath(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(
+                d for d in dirnames
+                if not d.startswith('.') and d not in _skip_dirs
+            )
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+def _stamp(fname: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def scan_file(fname: str) -> Tuple[str, Optional[List[int]], Dict[str, Any]]:
+    """
+    (file, stamp, {'sites': [...]} or {'error': message}) for one file.
+    """
+    import ast
+
+    stamp = _stamp(fname)
+    try:
+        with open(fname, 'rb') as in_f:
+            source = in_f.read()
+        if not sites.may_have_sites(source):
+            return fname, stamp, {'sites': []}
+        tree = ast.parse(source, fname)
+    except (OSError, SyntaxError, ValueError) as e:
+        return fname, stamp, {'error': '{}: {}'.format(type(e).__name__, e)}
+
+    lines = source.decode('utf-8', errors='replace').split('\n')
+    records = []
+    for site in sites.find_sites(tree):
+        line = lines[site.lineno - 1]
+        records.append({
+            'kind': site.kind,
+            'mode': site.mode,
+            'key': site.key,
+            'owner': site.owner,
+            'line': site.lineno,
+            # 1-based character column
+            'col': len(
+                line.encode('utf-8')[:site.node.col_offset]
+                .decode('utf-8', errors='replace')
+            ) + 1,
+        })
+    return fname, stamp, {'sites': records}
+
+
+class ScanCache:
+    """
+    file -> (stamp, scan result), saved as JSON between runs.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path is None:
+            return
+        try:
+            with open(path, 'r') as in_f:
+                data = json.load(in_f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == CACHE_VERSION:
+            self.entries = data.get('files', {})
+
+    def get(self, fname: str, stamp: Optional[List[int]]) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(fname)
+        if entry is None or stamp is None or entry['stamp'] != stamp:
+            return None
+        return entry['result']
+
+    def put(self, fname: str, stamp: Optional[List[int]], result: Dict[str, Any]) -> None:
+        if stamp is not None:
+            self.entries[fname] = {'stamp': stamp, 'result': result}
+
+    def save(self, keep: Iterable[str]) -> None:
+        if self.path is None:
+            return
+        keep = set(keep)
+        files = {k: v for k, v in self.entries.items() if k in keep}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as out_f:
+            json.dump({'version': CACHE_VERSION, 'files': files}, out_f)
+        os.replace(tmp_path, self.path)
+
+
+def scan(
+        paths: Iterable[str],
+        cache_path: Optional[str] = DEFAULT_CACHE,
+        jobs: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    file -> {'sites': [...]} or {'error': message}, for every .py file under
+    `paths`.
+    """
+    cache = ScanCache(cache_path)
+    files = list(iter_source_files(paths))
+    results = {}
+    stale = []
+    for fname in files:
+        cached = cache.get(fname, _stamp(fname))
+        if cached is None:
+            stale.append(fname)
+        else:
+            results[fname] = cached
+
+    if jobs == 1 or len(stale) < _PARALLEL_MIN_FILES:
+        for fname, stamp, result in map(scan_file, stale):
+            results[fname] = result
+            cache.put(fname, stamp, result)
+    else:
+        with ProcessPoolExecutor(jobs) as pool:
+            chunksize = max(1, len(stale) // ((jobs or os.cpu_count() or 1) * 4))
+            for fname, stamp, result in pool.map(
+                    scan_file, stale, chunksize=chunksize
+            ):
+                results[fname] = result
+                cache.put(fname, stamp, result)
+
+    cache.save(files)
+    return {fname: results[fname] for fname in files}
+
+
+def fill_state(record: SiteRecordT, fname: str, store: Any) -> str:
+    """
+    'filled', 'unfilled', or 'anonymous' (prompts on every hit) for a site.
+    """
+    if record['key'] is None:
+        return 'anonymous'
+    if store is not None and store.get(
+            fname, record['mode'], record['key'], record['owner']
+    ) is not None:
+        return 'filled'
+    return 'unfilled'
+
+
+def run(args: Any) -> int:
+    store = None
+    store_path = args.store or os.environ.get('TODO_PLACEHOLDER_STORE')
+    if store_path:
+        from todo.store import FillStore
+        store = FillStore(store_path)
+        store.load()
+
+    results = scan(
+        args.paths or ['.'],
+        cache_path=None if args.no_cache else args.cache,
+        jobs=args.jobs,
+    )
+
+    rows = []
+    errors = []
+    for fname, result in results.items():
+        if 'error' in result:
+            errors.append((fname, result['error']))
+            continue
+        for record in result['sites']:
+            state = fill_state(record, fname, store)
+            if args.unfilled and state == 'filled':
+                continue
+            rows.append(dict(record, file=fname, state=state))
+
+    if args.json:
+        json.dump({'sites': rows, 'errors': dict(errors)}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        cwd = os.getcwd()
+        for row in rows:
+            label = row['key'] or '<anonymous>'
+            if row['owner'] is not None:
+                label = '{}.{}'.format(row['owner'], label)
+            sys.stdout.write('{}:{}:{}: {} {} [{}]\n'.format(
+                os.path.relpath(row['file'], cwd), row['line'], row['col'],
+                row['mode'], label, row['state'],
+            ))
+        for fname, error in errors:
+            sys.stderr.write('{}: could not scan ({})\n'.format(
+                os.path.relpath(fname, cwd), error
+            ))
+        counts = {}
+        for row in rows:
+            counts[row['state']] = counts.get(row['state'], 0) + 1
+        sys.stderr.write('{} files, {} sites ({})\n'.format(
+            len(results), len(rows),
+            ', '.join('{} {}'.format(n, s) for s, n in sorted(counts.items()))
+            or 'none',
+        ))
+    return 0
+
+
+def add_arguments(parser: Any) -> None:
+    parser.add_argument('paths', nargs='*', help='files or directories (default: .)')
+    parser.add_argument(
+        '--store',
+        help='fill store to check fill state against '
+             '(default: $TODO_PLACEHOLDER_STORE)',
+    )
+    parser.add_argument(
+        '--unfilled', action='store_true',
+        help='only list sites that would still prompt',
+    )
+    parser.add_argument('--json', action='store_true', help='output JSON')
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=None,
+        help='parser processes (default: one per CPU)',
+    )
+    parser.add_argument(
+        '--cache', default=DEFAULT_CACHE,
+        help='scan cache file (default: {})'.format(DEFAULT_CACHE),
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true', help="don't read or write the cache",
+    )
@@ -0,0 +1,383 @@
+"""
+Finding placeholder sites without running anything.
+
+This is the static counterpart to the runtime locating in `todo.placeholder`:
+it only sees what's spelled out in the source, i.e. placeholder objects bound
+to a name at module level by `name = [todo.]SomePlaceholder(...)`, and
+`[a]set_placeholder` calls with a constant key (or none, for anonymous ones).
+
+An attribute is only taken for a placeholder site where its name really is the
+module's placeholder: not where a function, class body or comprehension has a
+name of its own that hides it, and not at all if the name is bound to anything
+else in the module too.
+"""
+import ast
+from typing import *
+
+
+PLACEHOLDER_MODES = {
+    'Placeholder': 'expression',
+    'ExpressionPlaceholder': 'expression',
+    'StatementPlaceholder': 'statement',
+    'MultilinePlaceholder': 'multiline',
+}
+
+SET_PLACEHOLDER_NAMES = ('set_placeholder', 'aset_placeholder')
+
+_DYNAMIC = object()
+
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+_COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+_SCOPES = _FUNCTIONS + _COMPREHENSIONS + (ast.ClassDef,)
+# pattern nodes that bind a name, on pythons that have `match`
+_MATCH_BINDINGS = tuple(
+    getattr(ast, name) for name in ('MatchAs', 'MatchStar', 'MatchMapping')
+    if hasattr(ast, name)
+)
+
+
+class StaticSite:
+    """
+    A placeholder access found in source.
+
+    `node` is the whole access (the Await, for `await aset_placeholder(...)`),
+    `key` is None for anonymous calls. `owner` is the name of the placeholder
+    object for attribute sites, and None for calls (see `todo.store`).
+    """
+
+    def __init__(
+            self,
+            kind: str,
+            mode: str,
+            key: Optional[str],
+            node: ast.AST,
+            owner: Optional[str] = None,
+    ):
+        self.kind = kind
+        self.mode = mode
+        self.key = key
+        self.node = node
+        self.owner = owner
+
+    @property
+    def lineno(self) -> int:
+        return self.node.lineno
+
+    def __repr__(self) -> str:
+        return 'StaticSite({}, {}, {!r}, line {})'.format(
+            self.kind, self.mode,
+            self.key if self.owner is None else self.owner + '.' + self.key,
+            self.lineno,
+        )
+
+
+def _callee_name(func: ast.AST) -> Optional[str]:
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _constant_arg(
+        call: ast.Call,
+        index: int,
+        name: str,
+        default: Any = None,
+) -> Any:
+    # argument `name`, passed positionally at `index` or as a keyword; with
+    # *args or **kwargs in the call there's no telling
+    if any(isinstance(arg, ast.Starred) for arg in call.args):
+        return _DYNAMIC
+    if len(call.args) > index:
+        node = call.args[index]
+        return node.value if isinstance(node, ast.Constant) else _DYNAMIC
+    for keyword in call.keywords:
+        if keyword.arg is None:
+            return _DYNAMIC
+        if keyword.arg == name:
+            if isinstance(keyword.value, ast.Constant):
+                return keyword.value.value
+            return _DYNAMIC
+    return default
+
+
+def _placeholder_binding(node: ast.AST) -> Optional[Tuple[str, str]]:
+    # (name, mode) for `name = [todo.]SomePlaceholder(...)`
+    if not isinstance(node, ast.Assign) or len(node.targets) != 1:
+        return None
+    target, value = node.targets[0], node.value
+    if not isinstance(target, ast.Name) or not isinstance(value, ast.Call):
+        return None
+    mode = PLACEHOLDER_MODES.get(_callee_name(value.func))
+    if mode is None:
+        return None
+    return target.id, mode
+
+
+def _walk(tree: ast.AST) -> Iterator[ast.AST]:
+    # ast.walk, minus most of its overhead; parents still come before their
+    # children
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield node
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                stack.extend(v for v in value if isinstance(v, ast.AST))
+            elif isinstance(value, ast.AST):
+                stack.append(value)
+
+
+def _outer_parts(scope: ast.AST) -> List[ast.AST]:
+    # the parts of a nested scope that run in the scope around it
+    if isinstance(scope, ast.ClassDef):
+        return scope.decorator_list + scope.bases + scope.keywords
+    if isinstance(scope, _COMPREHENSIONS):
+        return [scope.generators[0].iter]
+    args = scope.args
+    parts = args.defaults + [d for d in args.kw_defaults if d is not None]
+    if isinstance(scope, ast.Lambda):
+        return parts
+    parts += scope.decorator_list
+    if scope.returns is not None:
+        parts.append(scope.returns)
+    for arg in args.posonlyargs + args.args + args.kwonlyargs + [
+            args.vararg, args.kwarg
+    ]:
+        if arg is not None and arg.annotation is not None:
+            parts.append(arg.annotation)
+    return parts
+
+
+def _inner_parts(scope: ast.AST) -> List[ast.AST]:
+    # the parts that run in the scope itself
+    if isinstance(scope, ast.Lambda):
+        return [scope.body]
+    if isinstance(scope, _COMPREHENSIONS):
+        if isinstance(scope, ast.DictComp):
+            parts = [scope.key, scope.value]
+        else:
+            parts = [scope.elt]
+        for i, generator in enumerate(scope.generators):
+            parts.append(generator.target)
+            parts += generator.ifs
+            if i:
+                parts.append(generator.iter)
+        return parts
+    return scope.body
+
+
+def _scope_walk(scope: ast.AST) -> Iterator[ast.AST]:
+    # every node that runs in `scope`; nested scopes are yielded, but only
+    # their outer parts are walked
+    stack = list(_inner_parts(scope))
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, _SCOPES):
+            stack.extend(_outer_parts(node))
+        else:
+            stack.extend(ast.iter_child_nodes(node))
+
+
+def _bindings(scope: ast.AST) -> Tuple[List[str], Set[str]]:
+    """
+    (names bound in `scope`, once per binding, and names it declares global).
+    """
+    bound = []
+    declared = set()
+    if isinstance(scope, _FUNCTIONS):
+        args = scope.args
+        bound += [
+            arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs
+            + [args.vararg, args.kwarg] if arg is not None
+        ]
+    for node in _scope_walk(scope):
+        if isinstance(node, ast.Name):
+            if not isinstance(node.ctx, ast.Load):
+                bound.append(node.id)
+        elif isinstance(node, (
+                ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef
+        )):
+            bound.append(node.name)
+        elif isinstance(node, _COMPREHENSIONS):
+            # := in a comprehension binds in the scope around it
+            bound += [
+                child.target.id for child in ast.walk(node)
+                if isinstance(child, ast.NamedExpr)
+            ]
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            bound += [
+                alias.asname or alias.name.split('.')[0]
+                for alias in node.names if alias.name != '*'
+            ]
+        elif isinstance(node, ast.ExceptHandler):
+            if node.name:
+                bound.append(node.name)
+        elif isinstance(node, ast.Global):
+            declared.update(node.names)
+        elif isinstance(node, ast.Nonlocal):
+            bound += node.names
+        elif isinstance(node, _MATCH_BINDINGS):
+            name = getattr(node, 'name', None) or getattr(node, 'rest', None)
+            if name:
+                bound.append(name)
+    return bound, declared
+
+
+def placeholder_names(tree: ast.Module) -> Dict[str, str]:
+    """
+    name -> replace mode, for every name bound to a placeholder object at
+    module level and to nothing else there.
+    """
+    names = {}
+    counts = {}
+    ambiguous = set()
+    for node in _scope_walk(tree):
+        binding = _placeholder_binding(node)
+        if binding is None:
+            continue
+        name, mode = binding
+        if names.setdefault(name, mode) != mode:
+            ambiguous.add(name)
+        counts[name] = counts.get(name, 0) + 1
+    if not names:
+        return {}
+    bound, _ = _bindings(tree)
+    for name, count in counts.items():
+        if bound.count(name) > count:
+            ambiguous.add(name)
+    return {name: mode for name, mode in names.items() if name not in ambiguous}
+
+
+def attr_sites(tree: ast.Module) -> List[StaticSite]:
+    """
+    Every `name.key` where `name` is one of the module's placeholder objects
+    (see `placeholder_names`) in the scope it's read in.
+    """
+    names = placeholder_names(tree)
+    if not names:
+        return []
+    found = []
+    # set by `global name` in a function, which makes it something else
+    rebound = set()
+    # (scope, names hidden in it, names hidden in scopes nested in it); a
+    # class body's names are only visible in the class body itself
+    scopes = [(tree, frozenset(), frozenset())]
+    while scopes:
+        scope, hidden, nested_hidden = scopes.pop()
+        for node in _scope_walk(scope):
+            if isinstance(node, _SCOPES):
+                bound, declared = _bindings(node)
+                bound = set(bound)
+                rebound |= bound & declared & names.keys()
+                inner = nested_hidden | (bound - declared) & names.keys()
+                if isinstance(node, ast.ClassDef):
+                    scopes.append((node, inner, nested_hidden))
+                else:
+                    scopes.append((node, inner, inner))
+                continue
+            site = attr_site(node, names)
+            if site is not None and site.owner not in hidden:
+                found.append(site)
+    return [site for site in found if site.owner not in rebound]
+
+
+def bound_name_at(fname: str, lineno: int) -> Optional[str]:
+    """
+    The name a placeholder object made on line `lineno` of `fname` is bound
+    to, if it's made by a plain `name = SomePlaceholder(...)`.
+    """
+    try:
+        with open(fname, 'rb') as in_f:
+            tree = ast.parse(in_f.read(), fname)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    for node in _walk(tree):
+        if not isinstance(node, ast.Assign):
+            continue
+        if not node.lineno <= lineno <= node.end_lineno:
+            continue
+        binding = _placeholder_binding(node)
+        if binding is not None:
+            return binding[0]
+    return None
+
+
+def call_site(node: ast.AST) -> Optional[StaticSite]:
+    """
+    The site for a `[a]set_placeholder(...)` call (or an awaited one), if
+    `node` is one and its key and mode are constants.
+    """
+    kind = 'call'
+    call = node
+    if isinstance(node, ast.Await):
+        kind = 'await'
+        call = node.value
+    if not isinstance(call, ast.Call):
+        return None
+    if _callee_name(call.func) not in SET_PLACEHOLDER_NAMES:
+        return None
+
+    key = _constant_arg(call, 0, 'key')
+    mode = _constant_arg(call, 1, 'replace_mode')
+    if key is _DYNAMIC or mode is _DYNAMIC:
+        return None
+    if key is not None and not isinstance(key, str):
+        return None
+    if mode is not None and mode not in PLACEHOLDER_MODES.values():
+        return None
+    return StaticSite(kind, mode or 'expression', key, node)
+
+
+def attr_site(node: ast.AST, names: Mapping[str, str]) -> Optional[StaticSite]:
+    """
+    The site for `name.key`, if `node` is that and `name` is a placeholder.
+    """
+    if not isinstance(node, ast.Attribute) or not isinstance(node.ctx, ast.Load):
+        return None
+    if not isinstance(node.value, ast.Name) or node.value.id not in names:
+        return None
+    if node.attr.startswith('_'):
+        return None
+    return StaticSite(
+        'attr', names[node.value.id], node.attr, node, owner=node.value.id
+    )
+
+
+def find_sites(tree: ast.AST) -> List[StaticSite]:
+    """
+    Every placeholder site in `tree`, in source order.
+    """
+    sites = []
+    awaited = set()
+    for node in _walk(tree):
+        if not isinstance(node, (ast.Call, ast.Await)) or id(node) in awaited:
+            continue
+        site = call_site(node)
+        if site is None:
+            continue
+        if site.kind == 'await':
+            awaited.add(id(node.value))
+        sites.append(site)
+    sites += attr_sites(tree)
+    sites.sort(key=lambda site: (site.node.lineno, site.node.col_offset))
+    return sites
+
+
+def may_have_sites(source: bytes) -> bool:
+    """
+    False if `source` can't possibly hold a site, so there's no point parsing
+    it. Every placeholder class and function name has this in it.
+    """
+    return b'laceholder' in source
+
+
+def find_sites_in_file(fname: str) -> List[StaticSite]:
+    with open(fname, 'rb') as in_f:
+        source = in_f.read()
+    if not may_have_sites(source):
+        return []
+    return find_sites(ast.parse(source, fname))
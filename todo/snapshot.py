@@ -0,0 +1,203 @@
+"""
+Snapshots: fill placeholders offline, from a copy of the frame that hit them.
+
+With `todo.use_snapshots(directory)`, a placeholder with no fill doesn't open a
+session. Its frame's variables are written to a snapshot file in `directory`
+(see `todo.portable` for what survives the trip) and the access raises right
+away. Later, somewhere with a terminal:
+
+    python -m todo fill <snapshot> [--store fills.jsonl]
+
+opens the usual session against the restored variables and records the fill
+in the store, where the running process picks it up on its next hit.
+"""
+import hashlib
+import os
+import pickle
+import re
+import sys
+import tempfile
+import time
+from typing import *
+
+from todo.portable import freeze_namespace, thaw_namespace
+
+
+SNAPSHOT_VERSION = 1
+SUFFIX = '.snapshot'
+
+# values bigger than this when pickled only keep their type and repr
+MAX_VALUE_BYTES = 64 << 10
+
+SnapshotT = Dict[str, Any]
+
+# snapshots this process already wrote, so a hot placeholder doesn't keep
+# hitting the disk
+_written: Set[str] = set()
+
+
+def _label(key: str, owner: Optional[str]) -> str:
+    return key if owner is None else '{}.{}'.format(owner, key)
+
+
+def snapshot_path(
+        directory: str,
+        filename: str,
+        mode: str,
+        key: str,
+        owner: Optional[str] = None,
+) -> str:
+    """
+    Where the snapshot for a site goes: one per file, mode, key and owner,
+    however many times it's hit.
+    """
+    digest = hashlib.sha1(
+        '\0'.join([filename, mode, key, owner or '']).encode('utf-8')
+    ).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = '{}-{}-{}-{}{}'.format(
+        stem, mode, re.sub(r'[^\w.-]', '_', _label(key, owner))[:40], digest,
+        SUFFIX,
+    )
+    return os.path.join(directory, name)
+
+
+def write_snapshot(
+        directory: str,
+        filename: str,
+        mode: str,
+        key: str,
+        namespace: Mapping[str, Any],
+        store: Optional[str] = None,
+        owner: Optional[str] = None,
+) -> str:
+    """
+    Save `namespace` for the site, unless there's a snapshot for it already,
+    and return the snapshot's path.
+    """
+    path = snapshot_path(directory, filename, mode, key, owner)
+    if path in _written or os.path.exists(path):
+        _written.add(path)
+        return path
+
+    data = pickle.dumps({
+        'version': SNAPSHOT_VERSION,
+        # as the process knows it, that's what the store is keyed on
+        'filename': filename,
+        'mode': mode,
+        'key': key,
+        'owner': owner,
+        'store': os.path.abspath(store) if store else None,
+        'pid': os.getpid(),
+        'time': time.time(),
+        'namespace': freeze_namespace(namespace, max_bytes=MAX_VALUE_BYTES),
+    })
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out_f:
+            out_f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _written.add(path)
+    return path
+
+
+def load_snapshot(path: str) -> SnapshotT:
+    with open(path, 'rb') as in_f:
+        snapshot = pickle.load(in_f)
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError('{} is not a placeholder snapshot'.format(path))
+    return snapshot
+
+
+def fail_unfilled(
+        directory: str,
+        filename: Optional[str],
+        mode: str,
+        key: Optional[str],
+        namespace: Mapping[str, Any],
+        store: Optional[str] = None,
+        owner: Optional[str] = None,
+) -> NoReturn:
+    """
+    Snapshot the frame of an unfilled placeholder, and raise.
+    """
+    if key is None or filename is None:
+        raise RuntimeError(
+            'Placeholder {} has no fill, and snapshots are on so it won\'t '
+            'prompt. Anonymous placeholders can\'t be filled offline, give '
+            'it a key.'.format(key or '<anonymous>')
+        )
+    if store is None:
+        # the fill would go somewhere this process never looks
+        raise RuntimeError(
+            'Placeholder "{}" in {} ({}) has no fill, and snapshots are on so '
+            'it won\'t prompt. Filling it offline needs a fill store for the '
+            'fill to come back through: call `todo.use_store(path)` or set '
+            'TODO_PLACEHOLDER_STORE.'.format(_label(key, owner), filename, mode)
+        )
+    path = write_snapshot(
+        directory, filename, mode, key, namespace, store, owner
+    )
+    raise RuntimeError(
+        'Placeholder "{}" in {} ({}) has no fill. Its frame was saved to {}, '
+        'fill it in with `python -m todo fill {}`'.format(
+            _label(key, owner), filename, mode, path, path
+        )
+    )
+
+
+def run(args: Any) -> int:
+    from todo import placeholder
+
+    snapshot = load_snapshot(args.snapshot)
+    filename = snapshot['filename']
+    mode = snapshot['mode']
+    key = snapshot['key']
+    owner = snapshot.get('owner')
+
+    store_path = (
+        args.store
+        or os.environ.get('TODO_PLACEHOLDER_STORE')
+        or snapshot['store']
+    )
+    if not store_path:
+        sys.stderr.write(
+            'Nowhere to record the fill: the process had no fill store, pass '
+            'one with --store\n'
+        )
+        return 2
+    placeholder.use_store(store_path)
+
+    # so values of classes from the program's own modules can be unpickled
+    sys.path.insert(0, os.path.dirname(os.path.abspath(filename)))
+    namespace = thaw_namespace(snapshot['namespace'])
+
+    session = placeholder._owner_session(filename, mode, owner)
+    fill = session.interact(key, namespace)
+    placeholder.default_store.put(filename, mode, key, fill, owner)
+    sys.stderr.write('Recorded fill for "{}" in {} ({}) to {}\n'.format(
+        _label(key, owner), filename, mode, store_path
+    ))
+    if not args.keep:
+        os.unlink(args.snapshot)
+    return 0
+
+
+def add_arguments(parser: Any) -> None:
+    parser.add_argument('snapshot', help='snapshot file written by the process')
+    parser.add_argument(
+        '--store',
+        help='fill store to record the fill in (default: '
+             '$TODO_PLACEHOLDER_STORE, or the store the process was using)',
+    )
+    parser.add_argument(
+        '--keep', action='store_true',
+        help="don't delete the snapshot once it's filled",
+    )
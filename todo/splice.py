@@ -0,0 +1,220 @@
+"""
+Line edits to source files without reading them into memory.
+
+A `SourceFile` memory-maps the file and finds line offsets only as far as it
+needs them. Edits are written out as a copy of the untouched byte ranges with
+the new lines in between, to a temporary file next to the original that is
+then renamed over it. A crash partway leaves the original as it was.
+"""
+import mmap
+import os
+import stat
+import tempfile
+from typing import *
+
+
+class SourceFile:
+    def __init__(self, path: str):
+        # edit the file a symlink points to, not the link
+        self.path = os.path.realpath(path)
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            self.stat = os.fstat(fd)
+            self.size = self.stat.st_size
+            # an empty file can't be mapped
+            self.data = (
+                mmap.mmap(fd, 0, access=mmap.ACCESS_READ) if self.size else b''
+            )
+        finally:
+            os.close(fd)
+        # byte offset of the start of each line indexed so far
+        self.starts = [0]
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self) -> 'SourceFile':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def line_span(self, lineno: int) -> Tuple[int, int]:
+        """
+        Byte range of line `lineno` (0-based), newline included.
+        """
+        starts = self.starts
+        while len(starts) <= lineno + 1:
+            pos = starts[-1]
+            if pos >= self.size:
+                raise IndexError('{} has no line {}'.format(self.path, lineno + 1))
+            nl = self.data.find(b'\n', pos)
+            starts.append(self.size if nl == -1 else nl + 1)
+        return starts[lineno], starts[lineno + 1]
+
+    def line(self, lineno: int) -> str:
+        start, end = self.line_span(lineno)
+        return self.data[start:end].decode('utf-8')
+
+    def splice(self, edits: Mapping[int, str]) -> None:
+        """
+        Replace whole lines: line number -> text to put there instead (any
+        number of lines, with their newlines).
+        """
+        spans = sorted(
+            (self.line_span(lineno), text) for lineno, text in edits.items()
+        )
+        dirname, basename = os.path.split(self.path)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix='.{}.'.format(basename), suffix='.tmp', dir=dirname
+        )
+        try:
+            with os.fdopen(fd, 'wb') as out_f:
+                pos = 0
+                with memoryview(self.data) as view:
+                    for (start, end), text in spans:
+                        out_f.write(view[pos:start])
+                        out_f.write(text.encode('utf-8'))
+                        pos = end
+                    out_f.write(view[pos:])
+                out_f.flush()
+                os.fsync(out_f.fileno())
+            os.chmod(tmp_path, stat.S_IMODE(self.stat.st_mode))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+class EditLog:
+    """
+    Where lines and columns of a file, as it was compiled, have got to after
+    the edits made to it since.
+
+    Lines that were replaced by some other number of lines are kept in a
+    Fenwick tree of line count changes, so mapping a line either way is
+    O(log n) however many edits there were. Edits within a line are kept per
+    line, as byte spans, to move columns to the right of them.
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        # Fenwick tree over the line count change at each original line
+        self.tree = [0] * (self.size + 1)
+        self.deltas: Dict[int, int] = {}
+        # original line -> [(original start, original end, new length)], in
+        # bytes and in order
+        self.spans: Dict[int, List[Tuple[int, int, int]]] = {}
+
+    def _grow(self, lineno: int) -> None:
+        while self.size <= lineno:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+        for line, delta in self.deltas.items():
+            self._add(line, delta)
+
+    def _add(self, lineno: int, delta: int) -> None:
+        i = lineno + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _shift(self, lineno: int) -> int:
+        # line count change from every original line before `lineno`
+        shift = 0
+        i = min(lineno, self.size)
+        while i > 0:
+            shift += self.tree[i]
+            i -= i & -i
+        return shift
+
+    def line(self, lineno: int) -> int:
+        """
+        Current index of original line `lineno` (0-based).
+        """
+        return lineno + self._shift(lineno)
+
+    def original_line(self, lineno: int) -> int:
+        """
+        Original index of the line at current index `lineno`, or of the line
+        it was put there in place of.
+        """
+        # walk down the tree for the last original line starting at or
+        # before `lineno`; each original line now spans 1 + its delta lines
+        pos = 0
+        remaining = lineno
+        step = self.size
+        while step:
+            i = pos + step
+            if i <= self.size and step + self.tree[i] <= remaining:
+                pos = i
+                remaining -= step + self.tree[i]
+            step //= 2
+        if pos == self.size:
+            return pos + remaining
+        return pos
+
+    def col(self, lineno: int, col: int) -> Optional[int]:
+        """
+        Current byte column of an original one, None if it was edited away.
+        """
+        shift = 0
+        for start, end, new_len in self.spans.get(lineno, ()):
+            if col < start:
+                break
+            if col < end:
+                return None
+            shift += new_len - (end - start)
+        return col + shift
+
+    def replace_span(
+            self,
+            lineno: int,
+            start: int,
+            end: int,
+            new_len: int,
+    ) -> None:
+        """
+        Record that bytes `start:end` of the line now at `lineno` were
+        replaced by `new_len` bytes.
+        """
+        original = self.original_line(lineno)
+        before = []
+        after = []
+        shift = 0
+        inner_shift = 0
+        for span in self.spans.get(original, ()):
+            old_start, old_end, old_len = span
+            cur_start = old_start + shift + inner_shift
+            cur_end = cur_start + old_len
+            delta = old_len - (old_end - old_start)
+            if after or (cur_start >= end and cur_end > start):
+                after.append(span)
+            elif cur_end <= start:
+                before.append(span)
+                shift += delta
+            elif start <= cur_start and cur_end <= end:
+                # replaced along with the text around it
+                inner_shift += delta
+            else:
+                return  # cuts into an earlier edit, there's no telling where
+        self.spans[original] = before + [
+            (start - shift, end - shift - inner_shift, new_len)
+        ] + after
+
+    def replace_line(self, lineno: int, new_lines: int) -> None:
+        """
+        Record that the line now at `lineno` was replaced by `new_lines` lines.
+        """
+        original = self.original_line(lineno)
+        if original >= self.size:
+            self._grow(original)
+        self.deltas[original] = self.deltas.get(original, 0) + new_lines - 1
+        self._add(original, new_lines - 1)
+        self.spans.pop(original, None)
@@ -0,0 +1,250 @@
+"""
+Fills saved to disk, so that a fresh process (or a whole fleet of them) doesn't
+have to ask for the same keys again.
+"""
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import threading
+from typing import *
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # no advisory locks; appends still go through O_APPEND
+
+
+StoreKeyT = Tuple[str, str, str, Optional[str]]
+CodeFillT = Union[str, List[str]]
+StampT = Tuple[int, int]
+
+
+@contextlib.contextmanager
+def _locked(fd: int, exclusive: bool):
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class FillStore:
+    """
+    An append-only log of fills, one JSON record per line, keyed by
+    (source file, replace mode, key, owner). The last record for a key wins.
+
+    `owner` is None for `set_placeholder` calls, and the name a placeholder
+    object is bound to for its attributes, so that `p.key`, `q.key` and
+    `set_placeholder('key')` each get a fill of their own.
+
+    Each fill is stamped with a hash of its source file, and only handed out
+    while the file still hashes the same: like fills in memory, they're made
+    again once the file is edited. Placeholder's own rewrites are logged as
+    records of their own (see `note_rewrite`), so a fill stays good through
+    those, in whichever process reads the store.
+
+    Every fill is appended with a single write to a file opened with O_APPEND,
+    under an exclusive lock, so several processes can share one store. Loading
+    memory-maps the log and only parses what's been appended since the last
+    load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # key -> (fill, hash of the source it was made under)
+        self.fills: Dict[StoreKeyT, Tuple[CodeFillT, Optional[str]]] = {}
+        # file -> hash -> hashes placeholder rewrote the file from into it
+        self.rewrites: Dict[str, Dict[str, Set[str]]] = {}
+        self._loaded = 0  # bytes of the log that have been parsed
+        self._load_lock = threading.Lock()
+        # file -> (stamp, hash) as last read
+        self._hashes: Dict[str, Tuple[StampT, str]] = {}
+
+    @staticmethod
+    def _key(
+            filename: str,
+            mode: str,
+            key: str,
+            owner: Optional[str],
+    ) -> StoreKeyT:
+        return os.path.abspath(filename), mode, key, owner
+
+    def source_hash(self, filename: str) -> Optional[str]:
+        """
+        Hash of the file as it is now, None if it can't be read.
+        """
+        fname = os.path.abspath(filename)
+        try:
+            st = os.stat(fname)
+            stamp = st.st_mtime_ns, st.st_size
+            cached = self._hashes.get(fname)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            with open(fname, 'rb') as in_f:
+                digest = hashlib.sha1(in_f.read()).hexdigest()
+        except OSError:
+            return None
+        self._hashes[fname] = (stamp, digest)
+        return digest
+
+    def _is_current(self, fname: str, digest: Optional[str]) -> bool:
+        # made under the file as it is, or as it was before placeholder
+        # rewrote it into what it is
+        if digest is None:
+            return True  # from before records were stamped
+        current = self.source_hash(fname)
+        if current is None or current == digest:
+            return True
+        rewrites = self.rewrites.get(fname)
+        if not rewrites:
+            return False
+        seen = {current}
+        pending = [current]
+        while pending:
+            for before in rewrites.get(pending.pop(), ()):
+                if before == digest:
+                    return True
+                if before not in seen:
+                    seen.add(before)
+                    pending.append(before)
+        return False
+
+    def get(
+            self,
+            filename: str,
+            mode: str,
+            key: str,
+            owner: Optional[str] = None,
+    ) -> Optional[CodeFillT]:
+        store_key = self._key(filename, mode, key, owner)
+        if store_key not in self.fills:
+            # another process might have filled it since we last looked
+            self.load()
+        entry = self.fills.get(store_key)
+        if entry is None:
+            return None
+        fill, digest = entry
+        if not self._is_current(store_key[0], digest):
+            self.load()  # the rewrite that makes it current may be new
+            if not self._is_current(store_key[0], digest):
+                return None
+        return fill
+
+    def fills_for(
+            self,
+            filename: str,
+    ) -> Dict[Tuple[str, str, Optional[str]], CodeFillT]:
+        """
+        (mode, key, owner) -> fill, for every current fill of `filename`.
+        """
+        fname = os.path.abspath(filename)
+        self.load()
+        return {
+            (mode, key, owner): fill
+            for (store_fname, mode, key, owner), (fill, digest)
+            in list(self.fills.items())
+            if store_fname == fname and self._is_current(fname, digest)
+        }
+
+    def put(
+            self,
+            filename: str,
+            mode: str,
+            key: str,
+            fill: CodeFillT,
+            owner: Optional[str] = None,
+    ) -> None:
+        store_key = self._key(filename, mode, key, owner)
+        digest = self.source_hash(store_key[0])
+        self._append({
+            'file': store_key[0],
+            'mode': mode,
+            'key': key,
+            'owner': owner,
+            'fill': fill,
+            'source': digest,
+        })
+        self.fills[store_key] = (fill, digest)
+
+    def note_rewrite(self, filename: str, before: Optional[StampT]) -> None:
+        """
+        Placeholder just rewrote `filename`, which had stamp `before`: fills
+        made under the file as it was are still good for it as it is now.
+        Only known if the file was hashed at `before` (see `source_hash`).
+        """
+        fname = os.path.abspath(filename)
+        cached = self._hashes.get(fname)
+        if cached is None or cached[0] != before:
+            return
+        digest = self.source_hash(fname)
+        if digest is None or digest == cached[1]:
+            return
+        self._append({'file': fname, 'rewrite': [cached[1], digest]})
+        self.rewrites.setdefault(fname, {}).setdefault(digest, set()).add(
+            cached[1]
+        )
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        data = (json.dumps(record) + '\n').encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            with _locked(fd, exclusive=True):
+                written = 0
+                while written < len(data):
+                    written += os.write(fd, data[written:])
+        finally:
+            os.close(fd)
+
+    def load(self) -> None:
+        """
+        Read any records appended since the last load.
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        try:
+            with self._load_lock, _locked(fd, exclusive=False):
+                size = os.fstat(fd).st_size
+                if size < self._loaded:
+                    # the log was replaced under us, start over
+                    self._loaded = 0
+                if size == self._loaded:
+                    return
+                with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mm:
+                    self._loaded = self._parse(mm, self._loaded, size)
+        finally:
+            os.close(fd)
+
+    def _parse(self, mm: mmap.mmap, start: int, size: int) -> int:
+        # only whole lines; a half-written record gets picked up next time
+        end = mm.rfind(b'\n', start, size)
+        if end == -1:
+            return start
+        pos = start
+        while pos <= end:
+            nl = mm.find(b'\n', pos, end + 1)
+            try:
+                record = json.loads(mm[pos:nl])
+                if 'rewrite' in record:
+                    before, after = record['rewrite']
+                    self.rewrites.setdefault(record['file'], {}).setdefault(
+                        after, set()
+                    ).add(before)
+                else:
+                    store_key = (
+                        record['file'], record['mode'], record['key'],
+                        record.get('owner'),
+                    )
+                    self.fills[store_key] = (
+                        record['fill'], record.get('source')
+                    )
+            except (ValueError, KeyError, TypeError):
+                pass  # garbage left by a crashed writer
+            pos = nl + 1
+        return end + 1